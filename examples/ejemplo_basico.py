@@ -3,33 +3,46 @@ Ejemplo básico de uso de agentic-doc
 Demuestra cómo procesar un documento simple y obtener resultados
 """
 
+import functools
 import logging
 import os
-from pathlib import Path
 
-# Agregar el directorio padre al path para importar config
+# Agregar el directorio padre al path para importar config (una sola vez, al frente)
 import sys
-sys.path.append(str(Path(__file__).parent.parent))
+_DIRECTORIO_RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _DIRECTORIO_RAIZ not in sys.path:
+    sys.path.insert(0, _DIRECTORIO_RAIZ)
 
 from config import Config
 
+logger = logging.getLogger(__name__)
+
+# agentic-doc lee su configuración del entorno al importarse
+if Config.VISION_AGENT_API_KEY:
+    os.environ['VISION_AGENT_API_KEY'] = Config.VISION_AGENT_API_KEY
+
+# Importar agentic-doc una sola vez
+try:
+    from agentic_doc.parse import parse
+    AGENTIC_DISPONIBLE = True
+except ImportError:
+    AGENTIC_DISPONIBLE = False
+
+@functools.lru_cache(maxsize=1)
+def _resumen_config() -> tuple:
+    """Resumen de la configuración (se calcula una sola vez por proceso)"""
+    return tuple(Config.get_summary().items())
+
 def ejemplo_basico():
     """Ejemplo básico de procesamiento de documentos"""
     
-    # Configurar logging
-    logging.basicConfig(level=logging.INFO)
-    logger = logging.getLogger(__name__)
-    
     try:
         # Validar configuración
         Config.validate()
         
-        # Configurar variables de entorno
-        if Config.VISION_AGENT_API_KEY:
-            os.environ['VISION_AGENT_API_KEY'] = Config.VISION_AGENT_API_KEY
-        
-        # Importar agentic-doc
-        from agentic_doc.parse import parse
+        # Verificar agentic-doc
+        if not AGENTIC_DISPONIBLE:
+            raise ImportError("agentic-doc")
         logger.info("✅ Agentic-doc importado correctamente")
         
         logger.info("🚀 Ejecutando ejemplo básico...")
@@ -52,8 +65,9 @@ def ejemplo_basico():
             
             # Mostrar información de los primeros chunks
             logger.info("\n🔍 Primeros chunks extraídos:")
-            for i, chunk in enumerate(resultado.chunks[:3]):
-                logger.info(f"  Chunk {i+1}: {chunk.chunk_type} - {chunk.content[:100]}...")
+            primeros_chunks = resultado.chunks[:3]
+            for i, chunk in enumerate(primeros_chunks, start=1):
+                logger.info("  Chunk %d: %s - %.100s...", i, chunk.chunk_type, chunk.content)
                 
         except Exception as e:
             logger.warning(f"⚠️ No se pudo procesar la URL de ejemplo: {e}")
@@ -73,8 +87,7 @@ def ejemplo_basico():
         
         # Mostrar configuración actual
         logger.info("\n⚙️ Configuración actual:")
-        config_summary = Config.get_summary()
-        for key, value in config_summary.items():
+        for key, value in _resumen_config():
             logger.info(f"  {key}: {value}")
             
         logger.info("\n🎉 ¡Ejemplo básico completado!")
@@ -93,4 +106,6 @@ def ejemplo_basico():
         logger.error(f"❌ Error inesperado: {e}")
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    
     ejemplo_basico()
\ No newline at end of file
@@ -3,50 +3,90 @@ Ejemplo de extracción de campos específicos con agentic-doc
 Demuestra cómo usar modelos Pydantic para extraer datos estructurados
 """
 
+import functools
 import logging
 import os
-from pathlib import Path
-from typing import Optional, List
+from typing import Optional, List, Tuple, Type
 
-# Agregar el directorio padre al path para importar config
+from pydantic import BaseModel, Field
+
+# Agregar el directorio padre al path para importar config (una sola vez, al frente)
 import sys
-sys.path.append(str(Path(__file__).parent.parent))
+_DIRECTORIO_RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _DIRECTORIO_RAIZ not in sys.path:
+    sys.path.insert(0, _DIRECTORIO_RAIZ)
 
 from config import Config
 
+logger = logging.getLogger(__name__)
+
+# agentic-doc lee su configuración del entorno al importarse
+if Config.VISION_AGENT_API_KEY:
+    os.environ['VISION_AGENT_API_KEY'] = Config.VISION_AGENT_API_KEY
+
+# Importar agentic-doc una sola vez
+try:
+    from agentic_doc.parse import parse
+    AGENTIC_DISPONIBLE = True
+except ImportError:
+    AGENTIC_DISPONIBLE = False
+
+# ============================================================================
+# MODELOS DE EXTRACCIÓN
+# ============================================================================
+# Definidos a nivel de módulo para que la clase (y su esquema) se construya
+# una sola vez y no en cada llamada a los ejemplos
+
+# Definir modelo de datos para factura
+class DatosFactura(BaseModel):
+    numero_factura: Optional[str] = Field(description="Número de la factura o identificador único")
+    fecha_emision: Optional[str] = Field(description="Fecha de emisión de la factura")
+    empresa_emisora: Optional[str] = Field(description="Nombre de la empresa que emite la factura")
+    cliente_nombre: Optional[str] = Field(description="Nombre del cliente o destinatario")
+    subtotal: Optional[float] = Field(description="Subtotal antes de impuestos")
+    impuestos: Optional[float] = Field(description="Monto total de impuestos")
+    total: Optional[float] = Field(description="Monto total a pagar")
+    direccion_cliente: Optional[str] = Field(description="Dirección del cliente")
+
+# Modelo para datos de nómina
+class DatosNomina(BaseModel):
+    nombre_empleado: Optional[str] = Field(description="Nombre completo del empleado")
+    numero_empleado: Optional[str] = Field(description="Número o ID del empleado")
+    periodo_pago: Optional[str] = Field(description="Período de pago (fechas)")
+    salario_bruto: Optional[float] = Field(description="Salario bruto antes de deducciones")
+    deducciones_totales: Optional[float] = Field(description="Total de deducciones")
+    salario_neto: Optional[float] = Field(description="Salario neto después de deducciones")
+    horas_trabajadas: Optional[float] = Field(description="Total de horas trabajadas")
+
+# Modelo para contratos
+class DatosContrato(BaseModel):
+    partes_contrato: Optional[List[str]] = Field(description="Nombres de las partes del contrato")
+    fecha_firma: Optional[str] = Field(description="Fecha de firma del contrato")
+    vigencia_inicio: Optional[str] = Field(description="Fecha de inicio de vigencia")
+    vigencia_fin: Optional[str] = Field(description="Fecha de fin de vigencia")
+    monto_contrato: Optional[float] = Field(description="Valor monetario del contrato")
+    objeto_contrato: Optional[str] = Field(description="Objeto o propósito principal del contrato")
+    penalizaciones: Optional[str] = Field(description="Cláusulas de penalizaciones")
+
+@functools.lru_cache(maxsize=None)
+def _campos_modelo(modelo: Type[BaseModel]) -> Tuple[str, ...]:
+    """Nombres de los campos de un modelo de extracción (cacheado por clase)"""
+    return tuple(modelo.model_fields)
+
 def ejemplo_extraccion_factura():
     """Extrae campos específicos de una factura usando un modelo Pydantic"""
     
-    # Configurar logging
-    logging.basicConfig(level=logging.INFO)
-    logger = logging.getLogger(__name__)
-    
     try:
         # Validar configuración
         Config.validate()
         
-        # Configurar variables de entorno
-        if Config.VISION_AGENT_API_KEY:
-            os.environ['VISION_AGENT_API_KEY'] = Config.VISION_AGENT_API_KEY
-        
-        # Importar librerías necesarias
-        from pydantic import BaseModel, Field
-        from agentic_doc.parse import parse
+        # Verificar agentic-doc
+        if not AGENTIC_DISPONIBLE:
+            raise ImportError("agentic-doc")
         
         logger.info("✅ Librerías importadas correctamente")
         logger.info("🧾 Extrayendo campos específicos de factura...")
         
-        # Definir modelo de datos para factura
-        class DatosFactura(BaseModel):
-            numero_factura: Optional[str] = Field(description="Número de la factura o identificador único")
-            fecha_emision: Optional[str] = Field(description="Fecha de emisión de la factura")
-            empresa_emisora: Optional[str] = Field(description="Nombre de la empresa que emite la factura")
-            cliente_nombre: Optional[str] = Field(description="Nombre del cliente o destinatario")
-            subtotal: Optional[float] = Field(description="Subtotal antes de impuestos")
-            impuestos: Optional[float] = Field(description="Monto total de impuestos")
-            total: Optional[float] = Field(description="Monto total a pagar")
-            direccion_cliente: Optional[str] = Field(description="Dirección del cliente")
-        
         # URL de documento de ejemplo (puedes cambiar por tu documento)
         documento_url = "https://www.rbcroyalbank.com/banking-services/_assets-custom/pdf/eStatement.pdf"
         
@@ -63,15 +103,25 @@ def ejemplo_extraccion_factura():
         campos_extraidos = resultado.extraction
         metadatos = resultado.extraction_metadata
         
+        # Agentic-doc ya valida la extracción: si llega como dict, construir
+        # el modelo sin volver a pasar por los validadores de Pydantic
+        if isinstance(campos_extraidos, dict):
+            campos_extraidos = DatosFactura.model_construct(**campos_extraidos)
+        
+        # Resolver los metadatos de cada campo una sola vez
+        metadatos_campos = {campo: getattr(metadatos, campo, None) for campo in _campos_modelo(DatosFactura)}
+        
         logger.info("✅ Extracción completada")
         
         # Mostrar campos extraídos con confianza
         logger.info("\n📊 CAMPOS EXTRAÍDOS:")
         logger.info("=" * 50)
         
-        for campo, valor in campos_extraidos.dict().items():
+        for campo in _campos_modelo(type(campos_extraidos)):
+            valor = getattr(campos_extraidos, campo, None)
             if valor is not None:
-                confianza = getattr(metadatos, campo).confidence if hasattr(metadatos, campo) else "N/A"
+                meta_campo = metadatos_campos.get(campo)
+                confianza = meta_campo.confidence if meta_campo is not None else "N/A"
                 logger.info(f"📋 {campo.replace('_', ' ').title()}: {valor}")
                 logger.info(f"   🎯 Confianza: {confianza}")
             else:
@@ -94,25 +144,13 @@ def ejemplo_extraccion_factura():
 def ejemplo_extraccion_nomina():
     """Extrae campos de una nómina de empleado"""
     
-    logger = logging.getLogger(__name__)
-    
     try:
-        from pydantic import BaseModel, Field
-        from agentic_doc.parse import parse
+        if not AGENTIC_DISPONIBLE:
+            raise ImportError("agentic-doc")
         
         logger.info("\n💰 Extrayendo campos de nómina...")
         
-        # Modelo para datos de nómina
-        class DatosNomina(BaseModel):
-            nombre_empleado: Optional[str] = Field(description="Nombre completo del empleado")
-            numero_empleado: Optional[str] = Field(description="Número o ID del empleado")
-            periodo_pago: Optional[str] = Field(description="Período de pago (fechas)")
-            salario_bruto: Optional[float] = Field(description="Salario bruto antes de deducciones")
-            deducciones_totales: Optional[float] = Field(description="Total de deducciones")
-            salario_neto: Optional[float] = Field(description="Salario neto después de deducciones")
-            horas_trabajadas: Optional[float] = Field(description="Total de horas trabajadas")
-        
-        logger.info("📝 Modelo de nómina definido")
+        logger.info(f"📝 Modelo de nómina definido ({len(_campos_modelo(DatosNomina))} campos)")
         logger.info("💡 Para usar con tu documento:")
         logger.info("```python")
         logger.info("resultados = parse('nomina.pdf', extraction_model=DatosNomina)")
@@ -127,30 +165,18 @@ def ejemplo_extraccion_nomina():
 def ejemplo_extraccion_contrato():
     """Extrae campos importantes de un contrato"""
     
-    logger = logging.getLogger(__name__)
-    
     try:
-        from pydantic import BaseModel, Field
-        
         logger.info("\n📄 Modelo para contratos:")
         
-        # Modelo para contratos
-        class DatosContrato(BaseModel):
-            partes_contrato: Optional[List[str]] = Field(description="Nombres de las partes del contrato")
-            fecha_firma: Optional[str] = Field(description="Fecha de firma del contrato")
-            vigencia_inicio: Optional[str] = Field(description="Fecha de inicio de vigencia")
-            vigencia_fin: Optional[str] = Field(description="Fecha de fin de vigencia")
-            monto_contrato: Optional[float] = Field(description="Valor monetario del contrato")
-            objeto_contrato: Optional[str] = Field(description="Objeto o propósito principal del contrato")
-            penalizaciones: Optional[str] = Field(description="Cláusulas de penalizaciones")
-        
-        logger.info("📋 Modelo de contrato definido")
+        logger.info(f"📋 Modelo de contrato definido ({len(_campos_modelo(DatosContrato))} campos)")
         logger.info("💡 Útil para extraer información legal importante")
         
     except Exception as e:
         logger.error(f"❌ Error en ejemplo de contrato: {e}")
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    
     # Ejecutar ejemplo principal
     campos, metadatos = ejemplo_extraccion_factura()
     
@@ -159,7 +185,6 @@ if __name__ == "__main__":
     ejemplo_extraccion_contrato()
     
     # Consejos finales
-    logger = logging.getLogger(__name__)
     logger.info("\n💡 CONSEJOS PARA EXTRACCIÓN DE CAMPOS:")
     logger.info("1. Define descripciones claras en los Field()")
     logger.info("2. Usa tipos Optional para campos que pueden no existir")
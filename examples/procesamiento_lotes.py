@@ -3,39 +3,145 @@ Ejemplo de procesamiento en lotes con agentic-doc
 Demuestra cómo procesar múltiples documentos en paralelo
 """
 
+import asyncio
 import logging
 import os
+import tempfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List
+from typing import List, Union
+from urllib.parse import urlparse
 
-# Agregar el directorio padre al path para importar config
+import requests
+
+# Agregar el directorio padre al path para importar config (una sola vez, al frente)
 import sys
-sys.path.append(str(Path(__file__).parent.parent))
+_DIRECTORIO_RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _DIRECTORIO_RAIZ not in sys.path:
+    sys.path.insert(0, _DIRECTORIO_RAIZ)
 
 from config import Config
+from utilidades import contar_tipos_chunks
+
+logger = logging.getLogger(__name__)
+
+# agentic-doc lee su configuración (clave y parámetros de lote) del entorno al importarse
+if Config.VISION_AGENT_API_KEY:
+    os.environ['VISION_AGENT_API_KEY'] = Config.VISION_AGENT_API_KEY
+os.environ['BATCH_SIZE'] = str(Config.BATCH_SIZE)
+os.environ['MAX_WORKERS'] = str(Config.MAX_WORKERS)
+
+# Importar agentic-doc una sola vez
+try:
+    from agentic_doc.parse import parse
+    AGENTIC_DISPONIBLE = True
+except ImportError:
+    AGENTIC_DISPONIBLE = False
+
+# aiohttp es opcional: sin él, las URLs se descargan con un pool de hilos
+try:
+    import aiohttp
+    AIOHTTP_DISPONIBLE = True
+except ImportError:
+    AIOHTTP_DISPONIBLE = False
+
+# Límite de conexiones simultáneas recomendado por agentic-doc
+MAX_CONEXIONES = 100
+
+def _es_url(documento: str) -> bool:
+    """Indica si el documento es una URL remota"""
+    return documento.startswith(("http://", "https://"))
+
+def _destino_local(url: str, indice: int, directorio: Path) -> Path:
+    """
+    Ruta local para una URL: una subcarpeta por índice evita colisiones y conserva el
+    nombre original, que parse() usa para nombrar los resultados (siempre con extensión .pdf)
+    """
+    subdirectorio = directorio / f"{indice:04d}"
+    subdirectorio.mkdir(exist_ok=True)
+    nombre = Path(urlparse(url).path).name or "documento.pdf"
+    if not nombre.lower().endswith('.pdf'):
+        nombre += '.pdf'
+    return subdirectorio / nombre
+
+async def _descargar_uno(session, url: str, destino: Path) -> Path:
+    """Descarga una URL y escribe el contenido en disco sin bloquear el loop"""
+    async with session.get(url) as respuesta:
+        respuesta.raise_for_status()
+        contenido = await respuesta.read()
+    await asyncio.to_thread(destino.write_bytes, contenido)
+    return destino
+
+async def _prefetch_async(urls: List[str], directorio: Path) -> List[Union[Path, BaseException]]:
+    """Descarga todas las URLs concurrentemente con un pool de conexiones compartido (errores por URL)"""
+    limite = min(Config.BATCH_SIZE * Config.MAX_WORKERS, MAX_CONEXIONES)
+    conector = aiohttp.TCPConnector(limit=limite)
+    async with aiohttp.ClientSession(connector=conector) as session:
+        tareas = [
+            _descargar_uno(session, url, _destino_local(url, i, directorio))
+            for i, url in enumerate(urls)
+        ]
+        return await asyncio.gather(*tareas, return_exceptions=True)
+
+def deduplicar_documentos(documentos: List[str]) -> List[str]:
+    """Elimina documentos repetidos conservando el orden (URLs normalizadas, rutas reales)"""
+    return list(dict.fromkeys(
+        urlparse(d).geturl() if _es_url(d) else os.path.realpath(d)
+        for d in documentos
+    ))
+
+def _descargar_uno_sync(session: requests.Session, url: str, destino: Path) -> Path:
+    """Descarga una URL en streaming a disco (bloques de 64 KiB)"""
+    with session.get(url, stream=True, timeout=60) as respuesta:
+        respuesta.raise_for_status()
+        with open(destino, 'wb') as f:
+            for bloque in respuesta.iter_content(chunk_size=1 << 16):
+                f.write(bloque)
+    return destino
+
+def _prefetch_hilos(urls: List[str], directorio: Path) -> List[Union[Path, BaseException]]:
+    """Descarga las URLs con un pool de hilos y una sesión HTTP compartida (keep-alive; errores por URL)"""
+    with requests.Session() as session, ThreadPoolExecutor(max_workers=Config.BATCH_SIZE) as executor:
+        futuros = [
+            executor.submit(_descargar_uno_sync, session, url, _destino_local(url, i, directorio))
+            for i, url in enumerate(urls)
+        ]
+        return [futuro.exception() or futuro.result() for futuro in futuros]
+
+def prefetch_documentos(documentos: List[str], directorio: Path) -> List[str]:
+    """
+    Descarga en paralelo las URLs de la lista y devuelve la lista con rutas locales.
+    Los documentos locales, y las URLs que no se pudieron descargar, se devuelven sin
+    cambios (parse() intentará descargarlas por su cuenta).
+    """
+    urls = [d for d in documentos if _es_url(d)]
+    if not urls:
+        return list(documentos)
+    
+    if AIOHTTP_DISPONIBLE:
+        rutas = asyncio.run(_prefetch_async(urls, directorio))
+    else:
+        rutas = _prefetch_hilos(urls, directorio)
+    locales = {}
+    for url, ruta in zip(urls, rutas):
+        if isinstance(ruta, BaseException):
+            logger.warning("⚠️ No se pudo descargar %s: %s", url, ruta)
+        else:
+            locales[url] = ruta
+    return [str(locales.get(d, d)) for d in documentos]
 
 def procesar_documentos_en_lote():
     """Procesa múltiples documentos en paralelo"""
     
-    # Configurar logging
-    logging.basicConfig(level=logging.INFO)
-    logger = logging.getLogger(__name__)
-    
     try:
         # Validar configuración
         Config.validate()
         Config.create_directories()
         
-        # Configurar variables de entorno
-        if Config.VISION_AGENT_API_KEY:
-            os.environ['VISION_AGENT_API_KEY'] = Config.VISION_AGENT_API_KEY
-        
-        # Configurar parámetros de procesamiento en lote
-        os.environ['BATCH_SIZE'] = str(Config.BATCH_SIZE)
-        os.environ['MAX_WORKERS'] = str(Config.MAX_WORKERS)
-        
-        # Importar agentic-doc
-        from agentic_doc.parse import parse
+        # Verificar agentic-doc
+        if not AGENTIC_DISPONIBLE:
+            raise ImportError("agentic-doc")
         
         logger.info("✅ Agentic-doc importado correctamente")
         logger.info("📦 Procesando documentos en lote...")
@@ -54,39 +160,46 @@ def procesar_documentos_en_lote():
         #     "documentos/contrato1.pdf"
         # ]
         
+        # Evitar descargar y procesar dos veces el mismo documento
+        total_documentos = len(documentos)
+        documentos = deduplicar_documentos(documentos)
+        if len(documentos) < total_documentos:
+            logger.info(f"🔁 Eliminados {total_documentos - len(documentos)} documentos duplicados")
+        
         logger.info(f"📄 Procesando {len(documentos)} documentos...")
         
-        # Procesar documentos en lote con guardado de resultados
-        resultados = parse(
-            documentos,
-            result_save_dir=Config.RESULTS_DIR,
-            grounding_save_dir=Config.VISUALIZATIONS_DIR
-        )
+        with tempfile.TemporaryDirectory() as directorio_descargas:
+            # Descargar las URLs en paralelo para no serializar la red dentro de parse()
+            logger.info("⬇️ Descargando documentos en paralelo...")
+            documentos_locales = prefetch_documentos(documentos, Path(directorio_descargas))
+            
+            # Procesar documentos en lote con guardado de resultados
+            resultados = parse(
+                documentos_locales,
+                result_save_dir=Config.RESULTS_DIR,
+                grounding_save_dir=Config.VISUALIZATIONS_DIR
+            )
         
         logger.info("✅ Procesamiento en lote completado")
         logger.info(f"📊 Documentos procesados: {len(resultados)}")
         
         # Analizar resultados
         total_chunks = 0
-        tipos_chunks_globales = {}
+        tipos_chunks_globales = Counter()
         
-        for i, resultado in enumerate(resultados):
+        for i, resultado in enumerate(resultados, start=1):
             chunks_doc = len(resultado.chunks)
             total_chunks += chunks_doc
             
-            logger.info(f"\n📄 Documento {i+1}:")
-            logger.info(f"  📋 Chunks extraídos: {chunks_doc}")
-            logger.info(f"  💾 Archivo resultado: {resultado.result_path if hasattr(resultado, 'result_path') else 'N/A'}")
+            logger.info("\n📄 Documento %d:", i)
+            logger.info("  📋 Chunks extraídos: %d", chunks_doc)
+            logger.info("  💾 Archivo resultado: %s", getattr(resultado, 'result_path', 'N/A'))
             
-            # Contar tipos de chunks por documento
-            tipos_doc = {}
-            for chunk in resultado.chunks:
-                tipo = chunk.chunk_type.value if hasattr(chunk.chunk_type, 'value') else str(chunk.chunk_type)
-                tipos_doc[tipo] = tipos_doc.get(tipo, 0) + 1
-                tipos_chunks_globales[tipo] = tipos_chunks_globales.get(tipo, 0) + 1
+            tipos_doc = contar_tipos_chunks(resultado.chunks)
+            tipos_chunks_globales.update(tipos_doc)
             
             for tipo, cantidad in tipos_doc.items():
-                logger.info(f"    {tipo}: {cantidad}")
+                logger.info("    %s: %d", tipo, cantidad)
         
         # Resumen global
         logger.info(f"\n📊 RESUMEN GLOBAL:")
@@ -96,7 +209,7 @@ def procesar_documentos_en_lote():
         
         logger.info("\n🏷️ Distribución de tipos de contenido:")
         for tipo, cantidad in tipos_chunks_globales.items():
-            logger.info(f"  {tipo}: {cantidad} chunks")
+            logger.info("  %s: %d chunks", tipo, cantidad)
         
         return resultados
         
@@ -113,8 +226,6 @@ def procesar_documentos_en_lote():
 def ejemplo_conectores():
     """Muestra ejemplos de uso de conectores para diferentes fuentes"""
     
-    logger = logging.getLogger(__name__)
-    
     logger.info("\n🔌 EJEMPLOS DE CONECTORES:")
     logger.info("=" * 50)
     
@@ -169,8 +280,6 @@ def ejemplo_conectores():
 def consejos_optimizacion():
     """Proporciona consejos para optimizar el procesamiento"""
     
-    logger = logging.getLogger(__name__)
-    
     logger.info("\n🚀 CONSEJOS DE OPTIMIZACIÓN:")
     logger.info("=" * 50)
     
@@ -187,6 +296,8 @@ def consejos_optimizacion():
     logger.info("\n3. 💾 Gestión de Resultados:")
     logger.info("   - Usa result_save_dir para persistir resultados")
     logger.info("   - Usa grounding_save_dir para visualizaciones")
+    logger.info("   - grounding_save_dir escribe muchas imágenes pequeñas por documento:")
+    logger.info("     omítelo en lotes grandes si no necesitas las regiones recortadas")
     logger.info("   - Los archivos JSON contienen toda la información")
     
     logger.info("\n4. 📈 Monitoreo de Rendimiento:")
@@ -195,6 +306,8 @@ def consejos_optimizacion():
     logger.info("   - Considera el tamaño de archivos al configurar")
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    
     # Ejecutar procesamiento en lote
     resultados = procesar_documentos_en_lote()
     
@@ -204,7 +317,6 @@ if __name__ == "__main__":
     # Mostrar consejos
     consejos_optimizacion()
     
-    logger = logging.getLogger(__name__)
     logger.info(f"\n🎉 ¡Procesamiento en lote completado!")
     if resultados:
         logger.info(f"✅ {len(resultados)} documentos procesados exitosamente")
@@ -7,32 +7,52 @@ import logging
 import os
 from pathlib import Path
 
-# Agregar el directorio padre al path para importar config
+# Agregar el directorio padre al path para importar config (una sola vez, al frente)
 import sys
-sys.path.append(str(Path(__file__).parent.parent))
+_DIRECTORIO_RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _DIRECTORIO_RAIZ not in sys.path:
+    sys.path.insert(0, _DIRECTORIO_RAIZ)
 
 from config import Config
+from utilidades import contar_tipos_chunks
+
+logger = logging.getLogger(__name__)
+
+# agentic-doc lee su configuración del entorno al importarse
+if Config.VISION_AGENT_API_KEY:
+    os.environ['VISION_AGENT_API_KEY'] = Config.VISION_AGENT_API_KEY
+
+# Importar agentic-doc una sola vez
+try:
+    from agentic_doc.parse import parse
+    from agentic_doc.utils import viz_parsed_document
+    from agentic_doc.config import VisualizationConfig
+    AGENTIC_DISPONIBLE = True
+except ImportError:
+    AGENTIC_DISPONIBLE = False
+
+def escribir_bytes(ruta: Path, datos: bytes):
+    """Escribe bytes ya codificados directamente sobre el descriptor, sin capa de texto"""
+    fd = os.open(ruta, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        vista = memoryview(datos)
+        while vista:
+            escritos = os.write(fd, vista)
+            vista = vista[escritos:]
+    finally:
+        os.close(fd)
 
 def procesar_pdf_con_visualizacion():
     """Procesa un PDF y genera visualizaciones de las regiones extraídas"""
     
-    # Configurar logging
-    logging.basicConfig(level=logging.INFO)
-    logger = logging.getLogger(__name__)
-    
     try:
         # Validar configuración
         Config.validate()
         Config.create_directories()
         
-        # Configurar variables de entorno
-        if Config.VISION_AGENT_API_KEY:
-            os.environ['VISION_AGENT_API_KEY'] = Config.VISION_AGENT_API_KEY
-        
-        # Importar agentic-doc
-        from agentic_doc.parse import parse
-        from agentic_doc.utils import viz_parsed_document
-        from agentic_doc.config import VisualizationConfig
+        # Verificar agentic-doc
+        if not AGENTIC_DISPONIBLE:
+            raise ImportError("agentic-doc")
         
         logger.info("✅ Agentic-doc importado correctamente")
         logger.info("🚀 Procesando PDF con visualizaciones...")
@@ -82,21 +102,19 @@ def procesar_pdf_con_visualizacion():
         
         # Mostrar información detallada de los chunks
         logger.info("\n📋 Análisis de contenido extraído:")
-        tipos_chunks = {}
-        for chunk in resultado.chunks:
-            tipo = chunk.chunk_type.value if hasattr(chunk.chunk_type, 'value') else str(chunk.chunk_type)
-            tipos_chunks[tipo] = tipos_chunks.get(tipo, 0) + 1
+        tipos_chunks = contar_tipos_chunks(resultado.chunks)
         
         for tipo, cantidad in tipos_chunks.items():
-            logger.info(f"  {tipo}: {cantidad} chunks")
+            logger.info("  %s: %d chunks", tipo, cantidad)
         
         # Mostrar algunas regiones extraídas
         logger.info("\n🎯 Regiones extraídas (groundings):")
         groundings_count = 0
-        for chunk in resultado.chunks[:5]:  # Primeros 5 chunks
+        primeros_chunks = resultado.chunks[:5]  # Primeros 5 chunks
+        for chunk in primeros_chunks:
             for grounding in chunk.grounding:
                 if grounding.image_path:
-                    logger.info(f"  Grounding guardado: {grounding.image_path}")
+                    logger.info("  Grounding guardado: %s", grounding.image_path)
                     groundings_count += 1
         
         if groundings_count > 0:
@@ -104,8 +122,7 @@ def procesar_pdf_con_visualizacion():
         
         # Guardar el markdown en un archivo
         markdown_file = Path(Config.RESULTS_DIR) / "documento_procesado.md"
-        with open(markdown_file, 'w', encoding='utf-8') as f:
-            f.write(resultado.markdown)
+        escribir_bytes(markdown_file, resultado.markdown.encode('utf-8'))
         
         logger.info(f"📝 Markdown guardado en: {markdown_file}")
         
@@ -127,8 +144,6 @@ def procesar_pdf_con_visualizacion():
 def procesar_archivo_local():
     """Ejemplo de cómo procesar un archivo PDF local"""
     
-    logger = logging.getLogger(__name__)
-    
     logger.info("\n📁 Ejemplo de procesamiento de archivo local:")
     logger.info("```python")
     logger.info("from agentic_doc.parse import parse")
@@ -146,5 +161,7 @@ def procesar_archivo_local():
     logger.info("```")
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    
     procesar_pdf_con_visualizacion()
     procesar_archivo_local()
\ No newline at end of file
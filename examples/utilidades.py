@@ -0,0 +1,15 @@
+"""
+Utilidades compartidas por los ejemplos
+"""
+
+from collections import Counter
+from operator import attrgetter
+
+def contar_tipos_chunks(chunks) -> Counter:
+    """Cuenta los chunks de un documento por tipo"""
+    if not chunks:
+        return Counter()
+    # Todos los chunks de un documento comparten el esquema de chunk_type: decidirlo una vez
+    if hasattr(chunks[0].chunk_type, 'value'):
+        return Counter(map(attrgetter('chunk_type.value'), chunks))
+    return Counter(str(c.chunk_type) for c in chunks)
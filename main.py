@@ -9,18 +9,36 @@ import sys
 from pathlib import Path
 from datetime import datetime
 import argparse
+import atexit
+import functools
 import hashlib
-from typing import Dict, List, Optional
+import logging
+import logging.handlers
+import threading
+import time
+import traceback
+import uuid
+from collections import Counter, OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple
 from enum import Enum
 import os
+import queue
+import shutil
 from dotenv import load_dotenv
 from urllib.parse import urlparse
 
 # Cargar variables de entorno
 load_dotenv()
 
-from mistralai import Mistral
-from agentic_doc.parse import parse
+if TYPE_CHECKING:
+    import requests
+
+# orjson es opcional: si no está instalado se usa json de la librería estándar
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # ============================================================================
 # CONFIGURACIÓN Y ENUMS
@@ -35,16 +53,185 @@ class ProcessingStatus(str, Enum):
     COMPLETED = "completed"
     FAILED = "failed"
 
+# Versión del prompt de estructuración de Mistral. Forma parte de la clave de
+# caché del paso de transformación: cambiarla invalida las respuestas cacheadas.
+MISTRAL_PROMPT_VERSION = "3"
+
+# Niveles e íconos de PipelineManager.log
+LOG_LEVELS = {"DEBUG": logging.DEBUG, "INFO": logging.INFO, "SUCCESS": logging.INFO,
+              "WARNING": logging.WARNING, "ERROR": logging.ERROR}
+LOG_ICONS = {"INFO": "ℹ️", "SUCCESS": "✅", "ERROR": "❌", "WARNING": "⚠️", "DEBUG": "🔍"}
+
+# Pasos del pipeline, en orden de ejecución (claves de doc["steps"])
+PIPELINE_STEPS = ("download", "agentic_process", "transform")
+STEP_LABELS = {"download": "Descarga", "agentic_process": "Agentic-doc", "transform": "Transformación"}
+
+# Modelo de Mistral usado para estructurar páginas e imágenes
+MISTRAL_MODEL = "mistral-large-latest"
+
+# Prompt de estructuración: las instrucciones fijas van como mensaje de sistema
+# (idénticas en todas las llamadas) y el mensaje de usuario solo envuelve el OCR
+_MISTRAL_SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": (
+        "Convert the OCR markdown you receive into a structured JSON response with the following fields:\n"
+        "- file_name: string\n"
+        "- topics: list of strings\n"
+        "- languages: list of strings\n"
+        "- description: string\n"
+        "- ocr_contents: dictionary with the main extracted information\n"
+        "Respond only with the JSON object."
+    ),
+}
+_PAGE_PROMPT_PREFIX = "This is the pages OCR in markdown:\n====MARKDOWN====\n"
+_IMAGE_PROMPT_PREFIX = "This is the image OCR in markdown:\n====MARKDOWN====\n"
+_PROMPT_SUFFIX = "\n====END MARKDOWN===="
+
+# Páginas con menos caracteres que esto no se envían a Mistral
+MIN_STRUCTURE_CHARS = 40
+
+# Llamadas concurrentes a Mistral por documento (páginas y figuras)
+MISTRAL_PAGE_WORKERS = 8
+
+# Respuestas de página que se mantienen en memoria (LRU; el resto se relee de work/cache)
+PAGE_CACHE_SIZE = 1024
+
+# Reintentos del SDK de Mistral ante 429/5xx y errores de conexión: backoff exponencial
+# (intervalo inicial y máximo, exponente y tiempo total máximo; en milisegundos)
+MISTRAL_RETRY_BACKOFF = (1_000, 30_000, 2.0, 180_000)
+
+# Versión del formato del estado: la 1.1 usa IDs BLAKE2b (la 1.0 usaba md5)
+STATE_VERSION = "1.1"
+
+# Persistencia del estado: cada cambio de un documento se agrega a un journal
+# (JSONL) que se vuelca a disco como máximo una vez por intervalo (o al forzarlo),
+# y cada N eventos se compacta en un snapshot completo
+STATE_FLUSH_INTERVAL = 1.0  # segundos
+STATE_COMPACT_EVENTS = 500
+
+# Los chunks y figuras sin grounding se asignan a la página 1
+_SIN_GROUNDING = ({"page": 1},)
+
+# Marca de "atributo ausente" (distinta de un atributo con valor None)
+_SIN_TEXTO = object()
+
+def _ground_dump(groundings) -> List[Dict]:
+    """Serializar los groundings de agentic-doc (página 1-indexada y bounding box)"""
+    out = []
+    for grounding in groundings:
+        grounding_data = {}
+        page = getattr(grounding, 'page', None)
+        if page is not None:
+            grounding_data['page'] = page + 1  # Convertir de 0-indexed a 1-indexed
+        box = getattr(grounding, 'box', None)
+        if box:
+            model_dump = getattr(box, 'model_dump', None)
+            grounding_data['bbox'] = model_dump() if model_dump is not None else str(box)
+        out.append(grounding_data)
+    return out
+
+def _paginas(item: Dict) -> Dict[int, None]:
+    """Páginas distintas (en orden de aparición) en las que se ubica un chunk o figura"""
+    return dict.fromkeys(ground.get("page", 1) for ground in item.get("grounding") or _SIN_GROUNDING)
+
+@functools.lru_cache(maxsize=1)
+def _agentic_parse() -> Callable:
+    """Importar agentic-doc la primera vez que se procesa un documento (import pesado)"""
+    from agentic_doc.parse import parse
+    return parse
+
+@functools.lru_cache(maxsize=None)
+def _document_id(url: str) -> str:
+    """ID de 12 caracteres hex derivado de la URL (BLAKE2b de 6 bytes)"""
+    return hashlib.blake2b(url.encode(), digest_size=6).hexdigest()
+
+# Subcarpetas de cada output_folder que se cuentan en el resumen (carpeta, extensión)
+_SUMMARY_SUBDIRS = (("pdfs", ".pdf"), ("agentic_outputs", ".json"), ("pdf_processed", ".json"))
+
+def _count_ext(dirpath: Path, suffix: str) -> Optional[int]:
+    """Contar los archivos de un directorio con una extensión (un solo os.scandir; None si no existe)"""
+    try:
+        with os.scandir(dirpath) as entries:
+            return sum(1 for entry in entries
+                       if entry.name.endswith(suffix) and not entry.name.startswith('.')
+                       and entry.is_file(follow_symlinks=False))
+    except FileNotFoundError:
+        return None
+
+def _json_dumps(obj, indent: bool = False) -> bytes:
+    """Serializar a JSON UTF-8 (orjson si está disponible)"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0))
+    if indent:
+        return json.dumps(obj, ensure_ascii=False, indent=2).encode('utf-8')
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode('utf-8')
+
+def _json_loads(data):
+    """Deserializar JSON desde bytes o str (orjson si está disponible)"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def _jdump_atomic(obj, path: Path, indent: bool = False):
+    """
+    Escribir JSON en un archivo temporal y renombrarlo: nunca queda un archivo a medias.
+    El temporal tiene nombre único (varios hilos pueden escribir el mismo archivo) y se
+    crea con los permisos de la umask, como cualquier otra salida
+    """
+    path = Path(path)
+    tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        with open(tmp_path, 'xb') as f:
+            f.write(_json_dumps(obj, indent))
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+def _jdump_if_changed(obj: Dict, path: Path, indent: bool = False, ignore: Tuple[str, ...] = ()) -> bool:
+    """
+    Escribir JSON de forma atómica salvo que el archivo ya tenga exactamente el mismo contenido.
+    Las claves de primer nivel de ignore (p. ej. timestamps de la ejecución) se escriben siempre
+    que cambien, pero no cuentan como cambio: devuelve True solo si cambió algo más.
+    """
+    try:
+        previous = _jload(path)
+    except (FileNotFoundError, json.JSONDecodeError):
+        previous = None
+    if previous == obj:
+        return False
+    _jdump_atomic(obj, path, indent)
+    return not (isinstance(previous, dict)
+                and {k: v for k, v in previous.items() if k not in ignore} == {k: v for k, v in obj.items() if k not in ignore})
+
+def _jload(path: Path):
+    """Leer un archivo JSON completo"""
+    return _json_loads(Path(path).read_bytes())
+
 class PipelineManager:
     """
     Gestor central del pipeline con persistencia de estado y recuperación
     """
     
-    def __init__(self, work_dir: str = "work", verbose: bool = False, aip_country: str = None):
+    def __init__(self, work_dir: str = "work", verbose: bool = False, aip_country: str = None,
+                 parse_workers: Optional[int] = None, transform_workers: int = 4, pretty_json: bool = False,
+                 refresh: bool = False):
         self.work_dir = Path(work_dir)
         self.verbose = verbose
+        self._init_logging()
+        self.pretty_json = pretty_json  # JSON indentado en las salidas (solo para depuración)
+        self.refresh = refresh  # Revalidar con el servidor los PDFs ya descargados
+        self._ts_cache: Tuple[int, str] = (-1, "")  # (segundo, timestamp ISO) del último _now_iso()
         self.aip_country = aip_country  # País de la AIP (argentina, dominican_republic, etc)
         
+        # Hilos por etapa: descarga + agentic-doc (BATCH_SIZE) y transformación con Mistral
+        self.parse_workers = parse_workers if parse_workers is not None else int(os.getenv('BATCH_SIZE', '4'))
+        self.transform_workers = transform_workers
+        # Una etapa sin hilos dejaría a _run_stages esperando resultados para siempre
+        if self.parse_workers < 1 or self.transform_workers < 1:
+            raise ValueError(f"Se necesita al menos un hilo por etapa (parse_workers={self.parse_workers}, "
+                             f"transform_workers={self.transform_workers}; revisa BATCH_SIZE)")
+        
         # Crear directorio principal de trabajo
         self.work_dir.mkdir(exist_ok=True)
         
@@ -60,49 +247,269 @@ class PipelineManager:
         # Los PDFs se guardarán por país (determinado dinámicamente)
         self.pdfs_dir = None  # Se establece dinámicamente según output_folder
         
-        # Inicializar clientes
-        self.mistral_client = Mistral(api_key=os.getenv('MISTRAL_API_KEY'))
+        # Directorios de salida ya creados, por output_folder (evita mkdir repetidos)
+        self._dir_cache: Dict[str, Tuple[Path, Path, Path]] = {}
+        
+        # Conteos del resumen por (output_folder, subcarpeta): (mtime_ns, archivos)
+        self._folder_counts: Dict[Tuple[str, str], Tuple[int, int]] = {}
+        
+        # Listado de archivos por directorio de salida (comprobaciones de existencia sin stat)
+        self._dirlist_cache: Dict[str, set] = {}
+        self._dirlist_lock = threading.Lock()
+        
+        # Caché por contenido (SHA-256 del PDF), compartida entre AIPs
+        self.agentic_cache_dir = self.work_dir / "cache" / "agentic"
+        self.mistral_cache_dir = self.work_dir / "cache" / "mistral"
+        self.agentic_cache_dir.mkdir(parents=True, exist_ok=True)
+        self.mistral_pages_cache_dir = self.mistral_cache_dir / "pages"
+        self.mistral_cache_dir.mkdir(parents=True, exist_ok=True)
+        self.mistral_pages_cache_dir.mkdir(exist_ok=True)
+        
+        # Inicializar clientes: uno por pipeline, compartidos por todos los documentos
+        # para reutilizar conexiones (keep-alive) en lugar de renegociar TLS cada vez
+        # (cada documento en transformación lanza hasta MISTRAL_PAGE_WORKERS llamadas a la vez).
+        # El SDK de Mistral se importa aquí y no al cargar el módulo: --help y los
+        # errores de argumentos no pagan su importación
+        import httpx
+        from mistralai import Mistral
+        from mistralai.utils import BackoffStrategy, RetryConfig
+        mistral_connections = self.transform_workers * MISTRAL_PAGE_WORKERS
+        self.mistral_http = httpx.Client(
+            limits=httpx.Limits(
+                max_keepalive_connections=mistral_connections,
+                max_connections=mistral_connections
+            )
+        )
+        # Con hasta transform_workers × MISTRAL_PAGE_WORKERS llamadas en vuelo, un 429 es
+        # esperable: reintentar con backoff en lugar de caer en el fallback (que se guardaría
+        # como resultado final del documento)
+        self.mistral_client = Mistral(
+            api_key=os.getenv('MISTRAL_API_KEY'),
+            client=self.mistral_http,
+            retry_config=RetryConfig("backoff", BackoffStrategy(*MISTRAL_RETRY_BACKOFF), retry_connection_errors=True)
+        )
+        self.http = self._create_http_session()
         
-        # Archivo de estado
+        # Tabla de transiciones: paso del pipeline → método que lo ejecuta
+        self._transitions: Dict[str, Callable[[str], bool]] = {
+            "download": self.download_pdf,
+            "agentic_process": self.process_with_agentic_doc,
+            "transform": self.transform_to_pdf_processed,
+        }
+        self.mistral_errors = 0  # Llamadas a Mistral que terminaron en fallback
+        self._mistral_lock = threading.Lock()
+        self._page_cache: "OrderedDict[str, Dict]" = OrderedDict()  # LRU de respuestas por página (PAGE_CACHE_SIZE)
+        
+        # Archivo de estado (protegido por un lock: las etapas corren en hilos)
+        self._state_lock = threading.RLock()
+        self._dirty = False
+        self._journal_events = 0
+        self._last_flush = time.monotonic()
         self.state_file = self.state_dir / "pipeline_state.json"
+        self.journal_file = self.state_dir / "pipeline_state.log"
         self.state = self._load_state()
+        self._journal = open(self.journal_file, 'ab')
+        
+        # Consolidar lo que haya quedado en el journal de una ejecución anterior
+        # (así una última línea incompleta no se mezcla con los nuevos registros)
+        # o el estado recién migrado
+        if self._migrate_document_ids() or self.journal_file.stat().st_size:
+            self._compact_state(force=True)
+    
+    def _create_http_session(self) -> "requests.Session":
+        """Sesión HTTP compartida para descargas: pool de conexiones, reintentos y gzip"""
+        # requests/urllib3 se importan aquí y no al cargar el módulo (igual que el SDK de Mistral)
+        import requests
+        import urllib3
+        from requests.adapters import HTTPAdapter
+        from urllib3.exceptions import InsecureRequestWarning
+        from urllib3.util.retry import Retry
+        
+        # Las descargas se hacen con verify=False; silenciar el aviso (basta una vez por proceso)
+        urllib3.disable_warnings(InsecureRequestWarning)
+        
+        session = requests.Session()
+        session.headers.update({"Accept-Encoding": "gzip, deflate"})
+        # Una conexión keep-alive por hilo de descarga como mínimo; los reintentos
+        # cubren errores de conexión y respuestas transitorias del servidor
+        adapter = HTTPAdapter(
+            pool_connections=16,
+            pool_maxsize=max(32, self.parse_workers),
+            max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504))
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+    
+    def _init_logging(self):
+        """Logs en segundo plano: log() solo encola y un hilo formatea y escribe en stdout"""
+        self._t0 = time.monotonic()  # Cada línea lleva los segundos transcurridos desde aquí
+        self._log_queue = queue.SimpleQueue()
+        console = logging.StreamHandler(sys.stdout)
+        console.setFormatter(logging.Formatter("[%(elapsed)8.3fs] %(message)s"))
+        self._log_listener = logging.handlers.QueueListener(self._log_queue, console)
+        self._log_listener.start()
+        # Si no se llama a close(), vaciar la cola igualmente al salir
+        atexit.register(self._log_listener.stop)
+        
+        # Logger propio de esta instancia (fuera del registro global de logging)
+        self._logger = logging.Logger("pipeline", logging.DEBUG)
+        self._logger.addHandler(logging.handlers.QueueHandler(self._log_queue))
+    
+    def close(self):
+        """Cerrar las conexiones HTTP compartidas y el journal de estado, y vaciar los logs"""
+        with self._state_lock:
+            # Idempotente: puede llamarse otra vez desde un finally o una salida de contexto
+            if self._journal.closed:
+                return
+            self._journal.flush()
+            self._journal.close()
+        self.http.close()
+        self.mistral_http.close()
+        atexit.unregister(self._log_listener.stop)
+        self._log_listener.stop()
     
     def log(self, message: str, level: str = "INFO"):
         """Log con formato"""
         if self.verbose or level in ["ERROR", "WARNING"]:
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            icon = {"INFO": "ℹ️", "SUCCESS": "✅", "ERROR": "❌", "WARNING": "⚠️", "DEBUG": "🔍"}
-            print(f"[{timestamp}] {icon.get(level, '•')} {message}")
+            self._logger.log(LOG_LEVELS.get(level, logging.INFO), f"{LOG_ICONS.get(level, '•')} {message}",
+                             extra={"elapsed": time.monotonic() - self._t0})
+    
+    def _now_iso(self) -> str:
+        """Timestamp ISO con resolución de segundos (se formatea una vez por segundo)"""
+        now = int(time.time())
+        cached_second, cached_iso = self._ts_cache
+        if now != cached_second:
+            cached_iso = datetime.fromtimestamp(now).isoformat()
+            self._ts_cache = (now, cached_iso)
+        return cached_iso
     
     def _load_state(self) -> Dict:
-        """Cargar estado del procesamiento"""
+        """Cargar estado del procesamiento (snapshot + journal)"""
+        state = None
         if self.state_file.exists():
             try:
                 self.log(f"Cargando estado desde {self.state_file}", "DEBUG")
-                with open(self.state_file, 'r') as f:
-                    state = json.load(f)
-                    # Validar que tiene la estructura correcta
-                    if isinstance(state, dict) and "documents" in state:
-                        return state
+                state = _jload(self.state_file)
+                # Validar que tiene la estructura correcta
+                if not (isinstance(state, dict) and "documents" in state):
+                    state = None
             except (json.JSONDecodeError, IOError):
-                pass
+                state = None
         
-        return {
-            "created_at": datetime.now().isoformat(),
-            "documents": {},
-            "pipeline_version": "1.0"
-        }
+        if state is None:
+            state = {
+                "created_at": self._now_iso(),
+                "documents": {},
+                "pipeline_version": STATE_VERSION
+            }
+        
+        self._replay_journal(state)
+        return state
+    
+    def _migrate_document_ids(self) -> bool:
+        """Re-indexar los documentos de estados anteriores (IDs md5) con el ID actual"""
+        if self.state.get("pipeline_version", "1.0") == STATE_VERSION:
+            return False
+        
+        documents = {}
+        for doc_id, doc in self.state["documents"].items():
+            url = doc.get("url")
+            documents[_document_id(url) if url else doc_id] = doc
+        self.state["documents"] = documents
+        self.state["pipeline_version"] = STATE_VERSION
+        self.log(f"Estado migrado a la versión {STATE_VERSION} ({len(documents)} documentos)", "DEBUG")
+        return True
     
-    def _save_state(self):
-        """Persistir estado del procesamiento"""
-        self.state["updated_at"] = datetime.now().isoformat()
-        with open(self.state_file, 'w') as f:
-            json.dump(self.state, f, indent=2)
+    def _replay_journal(self, state: Dict):
+        """Aplicar sobre el snapshot los cambios registrados en el journal"""
+        if not self.journal_file.exists():
+            return
+        
+        replayed = 0
+        with open(self.journal_file, 'rb') as f:
+            for line in f:
+                try:
+                    record = _json_loads(line)
+                except json.JSONDecodeError:
+                    # Última línea incompleta (escritura interrumpida): se descarta
+                    break
+                if record["entry"] is None:
+                    state["documents"].pop(record["doc"], None)  # Documento descartado
+                else:
+                    state["documents"][record["doc"]] = record["entry"]
+                replayed += 1
+        
+        if replayed:
+            self.log(f"Journal aplicado: {replayed} cambios desde {self.journal_file}", "DEBUG")
+    
+    def _save_state(self, doc_id: str, force: bool = False):
+        """Registrar en el journal el nuevo estado de un documento (entry None si se descartó)"""
+        with self._state_lock:
+            record = {
+                "t": self._now_iso(),
+                "doc": doc_id,
+                "entry": self.state["documents"].get(doc_id)
+            }
+            self._journal.write(_json_dumps(record) + b"\n")
+            self._journal_events += 1
+            self._dirty = True
+            
+            if self._journal_events >= STATE_COMPACT_EVENTS:
+                self._compact_state()
+            else:
+                self.flush_state(force)
+    
+    def flush_state(self, force: bool = False):
+        """Volcar el journal a disco si hay cambios pendientes"""
+        with self._state_lock:
+            if not self._dirty:
+                return
+            if not force and time.monotonic() - self._last_flush < STATE_FLUSH_INTERVAL:
+                return
+            
+            self._journal.flush()
+            self._dirty = False
+            self._last_flush = time.monotonic()
+    
+    def _compact_state(self, force: bool = False):
+        """Escribir un snapshot completo del estado (atómico) y vaciar el journal"""
+        with self._state_lock:
+            # Sin transiciones desde el último snapshot no hay nada que reescribir
+            if not force and not self._journal_events:
+                return
+            self.state["updated_at"] = self._now_iso()
+            _jdump_atomic(self.state, self.state_file)
+            
+            # El snapshot ya contiene todos los cambios: el journal puede vaciarse
+            self._journal.flush()
+            self._journal.truncate(0)
+            
+            self._journal_events = 0
+            self._dirty = False
+            self._last_flush = time.monotonic()
         self.log(f"Estado guardado en {self.state_file}", "DEBUG")
     
+    def _file_sha256(self, path: Path) -> str:
+        """SHA-256 del contenido de un archivo (sin cargarlo entero en memoria)"""
+        with open(path, 'rb') as f:
+            if hasattr(hashlib, 'file_digest'):
+                return hashlib.file_digest(f, 'sha256').hexdigest()
+            digest = hashlib.sha256()
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+            return digest.hexdigest()
+    
+    def _read_cache(self, cache_path: Path) -> Optional[Dict]:
+        """Leer una entrada de caché (None si no existe o está corrupta)"""
+        try:
+            return _jload(cache_path)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+    
     def _get_document_id(self, url: str) -> str:
         """Generar ID único para un documento basado en la URL"""
-        return hashlib.md5(url.encode()).hexdigest()[:12]
+        return _document_id(url)
     
     def _get_filename_from_url(self, url: str) -> str:
         """Extrae el nombre original del archivo de la URL y asegura extensión .pdf"""
@@ -111,7 +518,7 @@ class PipelineManager:
         
         # Si no hay filename o está vacío, generar uno
         if not filename:
-            return f"document_{int(__import__('time').time())}.pdf"
+            return f"document_{int(time.time())}.pdf"
         
         # Asegurarse de que tiene extensión .pdf
         if not filename.lower().endswith('.pdf'):
@@ -127,6 +534,10 @@ class PipelineManager:
         
         output_folder = doc.get("metadata", {}).get("output_folder", "")
         
+        cached = self._dir_cache.get(output_folder)
+        if cached is not None:
+            return cached
+        
         if output_folder:
             # Crear directorios dentro de work/{output_folder}
             pdfs_dir = self.work_dir / output_folder / "pdfs"
@@ -143,8 +554,66 @@ class PipelineManager:
         agentic_dir.mkdir(parents=True, exist_ok=True)
         pdf_processed_dir.mkdir(parents=True, exist_ok=True)
         
+        self._dir_cache[output_folder] = (pdfs_dir, agentic_dir, pdf_processed_dir)
         return pdfs_dir, agentic_dir, pdf_processed_dir
     
+    def _dir_names(self, directory: Path) -> set:
+        """Nombres presentes en un directorio (un solo os.scandir por directorio y ejecución)"""
+        key = str(directory)
+        names = self._dirlist_cache.get(key)
+        if names is None:
+            with self._dirlist_lock:
+                names = self._dirlist_cache.get(key)
+                if names is None:
+                    try:
+                        with os.scandir(directory) as entries:
+                            names = {entry.name for entry in entries}
+                    except FileNotFoundError:
+                        names = set()
+                    self._dirlist_cache[key] = names
+        return names
+    
+    def _file_exists(self, path: Path) -> bool:
+        """Comprobar si existe una salida del pipeline sin un stat por archivo"""
+        return path.name in self._dir_names(path.parent)
+    
+    def _mark_exists(self, path: Path, exists: bool = True):
+        """Mantener al día el listado cacheado tras escribir o borrar una salida"""
+        names = self._dir_names(path.parent)
+        if exists:
+            names.add(path.name)
+        else:
+            names.discard(path.name)
+    
+    def _parts_dir(self, doc_id: str) -> Path:
+        """Directorio de resultados parciales de Mistral de un documento (reanudación)"""
+        paths = self._doc_paths(doc_id)
+        return Path(paths["pdf_processed_path"]).parent / ".parts" / paths["stem"]
+    
+    def _doc_paths(self, doc_id: str) -> Dict[str, str]:
+        """Rutas derivadas de un documento (calculadas una vez y guardadas en el estado)"""
+        doc = self.state["documents"][doc_id]
+        paths = doc.get("_paths")
+        if paths is None:
+            # Estados de versiones anteriores: calcularlas en el primer uso
+            with self._state_lock:
+                paths = doc["_paths"] = self._compute_doc_paths(doc_id)
+                self._save_state(doc_id)
+        return paths
+    
+    def _compute_doc_paths(self, doc_id: str) -> Dict[str, str]:
+        """Calcular nombre base y rutas de salida de un documento"""
+        doc = self.state["documents"][doc_id]
+        pdfs_dir, agentic_dir, pdf_processed_dir = self._get_output_dirs(doc_id)
+        filename = doc.get("original_filename") or self._get_filename_from_url(doc["url"])
+        stem = filename.rsplit('.', 1)[0]
+        return {
+            "stem": stem,
+            "pdf_path": str(pdfs_dir / filename),
+            "agentic_json_path": str(agentic_dir / f"{stem}.json"),
+            "pdf_processed_path": str(pdf_processed_dir / f"{stem}.json"),
+        }
+    
     def add_document(self, url: str, doc_id: Optional[str] = None, original_filename: Optional[str] = None) -> str:
         """Agregar documento a procesar"""
         if doc_id is None:
@@ -159,17 +628,22 @@ class PipelineManager:
                 "original_filename": original_filename,
                 "metadata": {},  # Metadata adicional (país, sección, etc)
                 "status": ProcessingStatus.PENDING,
-                "created_at": datetime.now().isoformat(),
+                "created_at": self._now_iso(),
                 "steps": {
                     "download": {"status": ProcessingStatus.PENDING, "timestamp": None},
                     "agentic_process": {"status": ProcessingStatus.PENDING, "timestamp": None},
                     "transform": {"status": ProcessingStatus.PENDING, "timestamp": None}
                 },
+                "_counts": {"pending": 3, "completed": 0, "failed": 0},
                 "files": {},
                 "errors": []
             }
-            self._save_state()
+            self.state["documents"][doc_id]["_paths"] = self._compute_doc_paths(doc_id)
+            self._save_state(doc_id)
             self.log(f"Documento agregado: {doc_id} ({original_filename})")
+        else:
+            # Recovery: asegurar que existan los directorios de salida
+            self._get_output_dirs(doc_id)
         
         return doc_id
     
@@ -195,6 +669,7 @@ class PipelineManager:
         # Si ya existe, retornar el ID (recovery)
         if doc_id in self.state["documents"]:
             self.log(f"Documento ya existe (recovery): {doc_id} ({original_filename})", "DEBUG")
+            self._get_output_dirs(doc_id)
             return doc_id
         
         # Crear entrada para el documento
@@ -211,54 +686,83 @@ class PipelineManager:
                 "output_folder": doc_info.get("output_folder", ""),
             },
             "status": ProcessingStatus.PENDING,
-            "created_at": datetime.now().isoformat(),
+            "created_at": self._now_iso(),
             "steps": {
                 "download": {"status": ProcessingStatus.PENDING, "timestamp": None},
                 "agentic_process": {"status": ProcessingStatus.PENDING, "timestamp": None},
                 "transform": {"status": ProcessingStatus.PENDING, "timestamp": None}
             },
+            "_counts": {"pending": 3, "completed": 0, "failed": 0},
             "files": {},
             "errors": []
         }
-        self._save_state()
+        self.state["documents"][doc_id]["_paths"] = self._compute_doc_paths(doc_id)
+        self._save_state(doc_id)
         self.log(f"Documento agregado: {doc_id} ({original_filename}) - {doc_info.get('country')} / {doc_info.get('section')}")
         
         return doc_id
     
+    def _remove_document(self, doc_id: str):
+        """Quitar un documento del estado (y registrarlo en el journal)"""
+        with self._state_lock:
+            if self.state["documents"].pop(doc_id, None) is not None:
+                self._save_state(doc_id)
+    
     def get_document_status(self, doc_id: str) -> Dict:
         """Obtener estado de un documento"""
         return self.state["documents"].get(doc_id)
     
+    def _step_counts(self, doc: Dict) -> Dict[str, int]:
+        """Contadores de pasos por estado (calculados en el primer uso en estados anteriores)"""
+        counts = doc.get("_counts")
+        if counts is None:
+            by_status = Counter(ProcessingStatus(step_info["status"]).value for step_info in doc["steps"].values())
+            counts = {key: by_status[key] for key in ("pending", "completed", "failed")}
+            doc["_counts"] = counts
+        return counts
+    
+    @staticmethod
+    def _count_step(counts: Dict[str, int], status, delta: int):
+        """Sumar delta al contador de un estado de paso (solo pending/completed/failed)"""
+        key = ProcessingStatus(status).value
+        if key in counts:
+            counts[key] += delta
+    
     def update_step_status(self, doc_id: str, step: str, status: ProcessingStatus, 
                           file_path: Optional[str] = None, error: Optional[str] = None):
         """Actualizar estado de un paso del procesamiento"""
-        if doc_id not in self.state["documents"]:
-            raise ValueError(f"Documento no encontrado: {doc_id}")
+        with self._state_lock:
+            if doc_id not in self.state["documents"]:
+                raise ValueError(f"Documento no encontrado: {doc_id}")
         
-        doc = self.state["documents"][doc_id]
-        doc["steps"][step]["status"] = status
-        doc["steps"][step]["timestamp"] = datetime.now().isoformat()
-        
-        if file_path:
-            doc["files"][step] = str(file_path)
-        
-        if error:
-            doc["errors"].append({
-                "step": step,
-                "error": error,
-                "timestamp": datetime.now().isoformat()
-            })
-        
-        # Actualizar estado general
-        all_steps = [s["status"] for s in doc["steps"].values()]
-        if all(s == ProcessingStatus.COMPLETED for s in all_steps):
-            doc["status"] = ProcessingStatus.COMPLETED
-        elif any(s == ProcessingStatus.FAILED for s in all_steps):
-            doc["status"] = ProcessingStatus.FAILED
-        elif all(s in [ProcessingStatus.PENDING, ProcessingStatus.COMPLETED] for s in all_steps):
-            doc["status"] = ProcessingStatus.DOWNLOADED if ProcessingStatus.PENDING not in all_steps else ProcessingStatus.PENDING
-        
-        self._save_state()
+            doc = self.state["documents"][doc_id]
+            counts = self._step_counts(doc)
+            self._count_step(counts, doc["steps"][step]["status"], -1)
+            self._count_step(counts, status, 1)
+            doc["steps"][step]["status"] = status
+            doc["steps"][step]["timestamp"] = self._now_iso()
+        
+            if file_path:
+                doc["files"][step] = str(file_path)
+        
+            if error:
+                doc["errors"].append({
+                    "step": step,
+                    "error": error,
+                    "timestamp": self._now_iso()
+                })
+        
+            # Actualizar estado general a partir de los contadores (sin recorrer los pasos)
+            total_steps = len(doc["steps"])
+            if counts["completed"] == total_steps:
+                doc["status"] = ProcessingStatus.COMPLETED
+            elif counts["failed"]:
+                doc["status"] = ProcessingStatus.FAILED
+            elif counts["pending"] + counts["completed"] == total_steps:
+                doc["status"] = ProcessingStatus.PENDING
+        
+            # Checkpoint al terminar cada paso
+            self._save_state(doc_id, force=True)
     
     # ========================================================================
     # PASO 1: DESCARGA DE PDF
@@ -272,34 +776,74 @@ class PipelineManager:
             return False
         
         url = doc["url"]
-        # Usar el nombre original guardado, NO extraer de la URL
-        filename = doc.get("original_filename", self._get_filename_from_url(url))
-        
-        # Obtener directorios dinámicos (incluyendo pdfs_dir)
-        pdfs_dir, _, _ = self._get_output_dirs(doc_id)
-        pdf_path = pdfs_dir / filename
-        
-        # Si ya está descargado, saltar
-        if pdf_path.exists():
+        # Ruta basada en el nombre original guardado, NO extraído de la URL
+        pdf_path = Path(self._doc_paths(doc_id)["pdf_path"])
+        filename = pdf_path.name
+        download_meta = doc["files"].get("download_meta") or {}
+        
+        # Si ya está descargado, saltar (o, con refresh, revalidar con un GET condicional)
+        exists = self._file_exists(pdf_path)
+        if exists and not (self.refresh and download_meta):
             self.log(f"PDF ya descargado: {filename}")
             self.update_step_status(doc_id, "download", ProcessingStatus.COMPLETED, str(pdf_path))
             return True
         
-        self.log(f"Descargando PDF: {filename} desde {url}", "INFO")
+        headers = {}
+        if exists:
+            if download_meta.get("etag"):
+                headers["If-None-Match"] = download_meta["etag"]
+            if download_meta.get("last_modified"):
+                headers["If-Modified-Since"] = download_meta["last_modified"]
+            self.log(f"Revalidando PDF: {filename} desde {url}", "INFO")
+        else:
+            self.log(f"Descargando PDF: {filename} desde {url}", "INFO")
         
         try:
-            import requests
-            from urllib3.exceptions import InsecureRequestWarning
-            import urllib3
-            urllib3.disable_warnings(InsecureRequestWarning)
+            # Descargar en streaming a un archivo temporal: memoria acotada y sin dejar
+            # un PDF a medias que la próxima ejecución tomaría como ya descargado
+            part_path = pdf_path.with_name(pdf_path.name + ".part")
+            total_bytes = 0
+            with self.http.get(url, headers=headers, verify=False, timeout=30, stream=True) as response:
+                if response.status_code == 304:
+                    self.log(f"PDF sin cambios en el servidor: {filename}")
+                    self.update_step_status(doc_id, "download", ProcessingStatus.COMPLETED, str(pdf_path))
+                    return True
+                response.raise_for_status()
+                with open(part_path, 'wb') as f:
+                    for block in response.iter_content(chunk_size=1 << 20):
+                        f.write(block)
+                        total_bytes += len(block)
+                # Solo los validadores que el servidor envió: sin ninguno no hay
+                # revalidación posible y el PDF no se vuelve a pedir con --refresh
+                download_meta = {key: value for key, value in (
+                    ("etag", response.headers.get("ETag")),
+                    ("last_modified", response.headers.get("Last-Modified")),
+                ) if value}
+            
+            # Servidor que ignora el GET condicional y responde 200 con el mismo PDF:
+            # conservar el archivo y las salidas derivadas
+            unchanged = exists and self._file_sha256(part_path) == self._file_sha256(pdf_path)
+            if unchanged:
+                part_path.unlink()
+            else:
+                os.replace(part_path, pdf_path)
+                self._mark_exists(pdf_path)
             
-            response = requests.get(url, verify=False, timeout=30)
-            response.raise_for_status()
+            with self._state_lock:
+                if download_meta:
+                    doc["files"]["download_meta"] = download_meta
+                else:
+                    doc["files"].pop("download_meta", None)
+                if exists and not unchanged:
+                    # El PDF cambió en el servidor: regenerar las salidas derivadas
+                    self._invalidate_outputs(doc_id)
             
-            with open(pdf_path, 'wb') as f:
-                f.write(response.content)
+            if unchanged:
+                self.log(f"PDF sin cambios: {filename}")
+                self.update_step_status(doc_id, "download", ProcessingStatus.COMPLETED, str(pdf_path))
+                return True
             
-            self.log(f"PDF descargado: {filename} ({len(response.content) / 1024 / 1024:.2f} MB)", "SUCCESS")
+            self.log(f"PDF descargado: {filename} ({total_bytes / 1024 / 1024:.2f} MB)", "SUCCESS")
             self.update_step_status(doc_id, "download", ProcessingStatus.COMPLETED, str(pdf_path))
             return True
             
@@ -309,6 +853,20 @@ class PipelineManager:
             self.update_step_status(doc_id, "download", ProcessingStatus.FAILED, error=error_msg)
             return False
     
+    def _invalidate_outputs(self, doc_id: str):
+        """Descartar las salidas de agentic-doc y Mistral de un documento cuyo PDF cambió"""
+        doc = self.state["documents"][doc_id]
+        paths = self._doc_paths(doc_id)
+        for step, path_key in (("agentic_process", "agentic_json_path"), ("transform", "pdf_processed_path")):
+            output_path = Path(paths[path_key])
+            output_path.unlink(missing_ok=True)
+            self._mark_exists(output_path, False)
+            doc["steps"][step] = {"status": ProcessingStatus.PENDING, "timestamp": None}
+            doc["files"].pop(step, None)
+        shutil.rmtree(self._parts_dir(doc_id), ignore_errors=True)
+        doc.pop("_counts", None)  # Se recalculan en el próximo cambio de paso
+        self.log(f"PDF actualizado, se reprocesará: {paths['stem']}", "INFO")
+    
     # ========================================================================
     # PASO 2: PROCESAR CON AGENTIC-DOC
     # ========================================================================
@@ -327,15 +885,11 @@ class PipelineManager:
         
         pdf_path = Path(doc["files"]["download"])
         
-        # Obtener directorios de salida basados en output_folder
-        _, agentic_outputs_dir, _ = self._get_output_dirs(doc_id)
-        
-        # Usar nombre original para el archivo JSON (sin sufijo)
-        original_filename_no_ext = doc.get("original_filename", f"document_{doc_id}").rsplit('.', 1)[0]
-        output_json_path = agentic_outputs_dir / f"{original_filename_no_ext}.json"
+        # JSON con el nombre original (sin sufijo), dentro de output_folder
+        output_json_path = Path(self._doc_paths(doc_id)["agentic_json_path"])
         
         # Si ya está procesado, saltar
-        if output_json_path.exists():
+        if self._file_exists(output_json_path):
             self.log(f"Agentic-doc output ya existe: {output_json_path.name}")
             self.update_step_status(doc_id, "agentic_process", ProcessingStatus.COMPLETED, str(output_json_path))
             return True
@@ -343,110 +897,120 @@ class PipelineManager:
         self.log(f"Procesando con Agentic-doc: {pdf_path.name}", "INFO")
         
         try:
-            # Procesar documento con agentic-doc
-            result = parse(str(pdf_path), result_save_dir=None)
-            
-            # Extraer información
-            chunks_list = []
-            figure_chunks = []  # Chunks de tipo figura/imagen
-            markdown_text = ""
-            total_chars = 0
-            
-            # Procesar los resultados
-            if result and len(result) > 0:
-                doc_result = result[0]
-                
-                # Obtener markdown
-                if hasattr(doc_result, 'markdown'):
-                    markdown_text = doc_result.markdown
-                    total_chars = len(markdown_text)
-                
-                # Procesar chunks
-                if hasattr(doc_result, 'chunks') and doc_result.chunks:
-                    for i, chunk in enumerate(doc_result.chunks):
-                        chunk_type_str = str(chunk.chunk_type)
-                        
-                        # Separar figuras del resto
-                        if "figure" in chunk_type_str.lower():
-                            figure_chunks.append(chunk)
-                        else:
-                            chunk_data = {
-                                "id": f"chunk_{i}",
-                                "content": chunk.text if hasattr(chunk, 'text') else str(chunk),
-                                "type": chunk_type_str,
-                            }
-                            
-                            # Agregar información de ubicación si existe
-                            if hasattr(chunk, 'grounding') and chunk.grounding:
-                                grounding_list = []
-                                for grounding in chunk.grounding:
-                                    grounding_data = {}
-                                    if hasattr(grounding, 'page'):
-                                        grounding_data['page'] = grounding.page + 1  # Convertir de 0-indexed a 1-indexed
-                                    if hasattr(grounding, 'box') and grounding.box:
-                                        grounding_data['bbox'] = grounding.box.model_dump() if hasattr(grounding.box, 'model_dump') else str(grounding.box)
-                                    grounding_list.append(grounding_data)
-                                chunk_data['grounding'] = grounding_list
-                            
-                            chunks_list.append(chunk_data)
+            # Reutilizar el resultado si este mismo PDF ya fue procesado
+            pdf_sha256 = self._file_sha256(pdf_path)
+            cache_path = self.agentic_cache_dir / f"{pdf_sha256}.json"
+            parsed = self._read_cache(cache_path)
+            
+            if parsed is not None:
+                self.log(f"Agentic-doc desde caché: {pdf_path.name}", "DEBUG")
+            else:
+                # Procesar documento con agentic-doc
+                result = _agentic_parse()(str(pdf_path), result_save_dir=None)
+                parsed = self._extract_agentic_content(result)
+                # Un parseo vacío (PDF dañado o respuesta parcial) no se cachea: se reutilizaría para siempre
+                if parsed["chunks"] or parsed["figures"]:
+                    _jdump_atomic(parsed, cache_path)
+            
+            chunks_list = parsed["chunks"]
+            figures_list = parsed["figures"]
+            markdown_text = parsed["markdown"]
             
             agentic_output = {
                 "metadata": {
                     "document_id": doc_id,
                     "source_url": doc["url"],
                     "pdf_path": str(pdf_path),
-                    "processed_date": datetime.now().isoformat(),
+                    "pdf_sha256": pdf_sha256,
+                    "processed_date": self._now_iso(),
                     "total_chunks": len(chunks_list),
-                    "total_figures": len(figure_chunks),
-                    "total_characters": total_chars
+                    "total_figures": len(figures_list),
+                    "total_characters": len(markdown_text or "")
                 },
                 "document": {
                     "id": doc_id,
                     "filename": doc.get("original_filename", "unknown"),
                     "markdown": markdown_text,
                     "chunks": chunks_list,
-                    "figures": []
+                    "figures": figures_list
                 }
             }
             
-            # Procesar figuras
-            for i, figure_chunk in enumerate(figure_chunks):
-                figure_data = {
-                    "id": f"figure_{i}",
-                    "text": figure_chunk.text if hasattr(figure_chunk, 'text') else "",
-                    "type": str(figure_chunk.chunk_type)
-                }
-                
-                # Agregar grounding de figuras
-                if hasattr(figure_chunk, 'grounding') and figure_chunk.grounding:
-                    grounding_list = []
-                    for grounding in figure_chunk.grounding:
-                        grounding_data = {}
-                        if hasattr(grounding, 'page'):
-                            grounding_data['page'] = grounding.page + 1  # Convertir de 0-indexed a 1-indexed
-                        if hasattr(grounding, 'box') and grounding.box:
-                            grounding_data['bbox'] = grounding.box.model_dump() if hasattr(grounding.box, 'model_dump') else str(grounding.box)
-                        grounding_list.append(grounding_data)
-                    figure_data['grounding'] = grounding_list
-                
-                agentic_output["document"]["figures"].append(figure_data)
+            # Guardar JSON (serializado de una vez; atómico para que una ejecución
+            # interrumpida no deje un archivo truncado que luego se tome por válido)
+            _jdump_atomic(agentic_output, output_json_path, indent=self.pretty_json)
+            self._mark_exists(output_json_path)
             
-            # Guardar JSON
-            with open(output_json_path, 'w', encoding='utf-8') as f:
-                json.dump(agentic_output, f, ensure_ascii=False, indent=2)
-            
-            self.log(f"Agentic-doc completado: {output_json_path.name} ({len(chunks_list)} chunks, {len(figure_chunks)} figuras)", "SUCCESS")
+            self.log(f"Agentic-doc completado: {output_json_path.name} ({len(chunks_list)} chunks, {len(figures_list)} figuras)", "SUCCESS")
             self.update_step_status(doc_id, "agentic_process", ProcessingStatus.COMPLETED, str(output_json_path))
             return True
             
         except Exception as e:
             error_msg = f"Error procesando con Agentic-doc: {str(e)}"
             self.log(error_msg, "ERROR")
-            import traceback
             self.log(f"Traceback: {traceback.format_exc()}", "DEBUG")
             self.update_step_status(doc_id, "agentic_process", ProcessingStatus.FAILED, error=error_msg)
             return False
     
+    def _extract_agentic_content(self, result) -> Dict:
+        """Extraer markdown, chunks y figuras del resultado de agentic-doc"""
+        chunks_list = []
+        figure_chunks = []  # Chunks de tipo figura/imagen
+        markdown_text = ""
+        
+        # Procesar los resultados
+        if result:
+            doc_result = result[0]
+            
+            # Obtener markdown
+            markdown_text = getattr(doc_result, 'markdown', "")
+            
+            # Procesar chunks
+            for i, chunk in enumerate(getattr(doc_result, 'chunks', None) or ()):
+                chunk_type_str = str(chunk.chunk_type)
+                
+                # Separar figuras del resto
+                if "figure" in chunk_type_str.lower():
+                    figure_chunks.append(chunk)
+                    continue
+                
+                # Sin atributo text se usa str(chunk); un text None se conserva como null
+                text = getattr(chunk, 'text', _SIN_TEXTO)
+                chunk_data = {
+                    "id": f"chunk_{i}",
+                    "content": str(chunk) if text is _SIN_TEXTO else text,
+                    "type": chunk_type_str,
+                }
+                
+                # Agregar información de ubicación si existe
+                grounding = getattr(chunk, 'grounding', None)
+                if grounding:
+                    chunk_data['grounding'] = _ground_dump(grounding)
+                
+                chunks_list.append(chunk_data)
+        
+        # Procesar figuras
+        figures_list = []
+        for i, figure_chunk in enumerate(figure_chunks):
+            figure_data = {
+                "id": f"figure_{i}",
+                "text": getattr(figure_chunk, 'text', ""),
+                "type": str(figure_chunk.chunk_type)
+            }
+            
+            # Agregar grounding de figuras
+            grounding = getattr(figure_chunk, 'grounding', None)
+            if grounding:
+                figure_data['grounding'] = _ground_dump(grounding)
+            
+            figures_list.append(figure_data)
+        
+        return {
+            "markdown": markdown_text,
+            "chunks": chunks_list,
+            "figures": figures_list
+        }
+    
     # ========================================================================
     # PASO 3: TRANSFORMAR A PDF_PROCESSED CON MISTRAL
     # ========================================================================
@@ -465,15 +1029,11 @@ class PipelineManager:
         
         agentic_json_path = Path(doc["files"]["agentic_process"])
         
-        # Obtener directorios de salida basados en output_folder
-        _, _, pdf_processed_dir = self._get_output_dirs(doc_id)
-        
-        # Usar nombre original para el archivo PDF transformado (sin sufijo)
-        original_filename_no_ext = doc.get("original_filename", f"document_{doc_id}").rsplit('.', 1)[0]
-        pdf_processed_path = pdf_processed_dir / f"{original_filename_no_ext}.json"
+        # JSON transformado con el nombre original (sin sufijo), dentro de output_folder
+        pdf_processed_path = Path(self._doc_paths(doc_id)["pdf_processed_path"])
         
         # Si ya está transformado, saltar
-        if pdf_processed_path.exists():
+        if self._file_exists(pdf_processed_path):
             self.log(f"PDF_processed ya existe: {pdf_processed_path.name}")
             self.update_step_status(doc_id, "transform", ProcessingStatus.COMPLETED, str(pdf_processed_path))
             return True
@@ -482,8 +1042,7 @@ class PipelineManager:
         
         try:
             # Cargar JSON de agentic-doc
-            with open(agentic_json_path, 'r', encoding='utf-8') as f:
-                agentic_json = json.load(f)
+            agentic_json = _jload(agentic_json_path)
             
             # Usar Mistral para transformación
             pdf_processed = self._mistral_transform(doc_id, agentic_json, doc)
@@ -495,17 +1054,16 @@ class PipelineManager:
                 return False
             
             # Guardar JSON transformado
-            with open(pdf_processed_path, 'w', encoding='utf-8') as f:
-                json.dump(pdf_processed, f, ensure_ascii=False, indent=2)
+            _jdump_atomic(pdf_processed, pdf_processed_path, indent=self.pretty_json)
+            self._mark_exists(pdf_processed_path)
+            
+            # Documento completo: los resultados parciales ya no hacen falta
+            shutil.rmtree(self._parts_dir(doc_id), ignore_errors=True)
             
             self.log(f"Transformación completada: {pdf_processed_path}", "SUCCESS")
+            # Último paso: update_step_status deja el documento como completado
             self.update_step_status(doc_id, "transform", ProcessingStatus.COMPLETED, str(pdf_processed_path))
             
-            # Marcar como completado
-            doc = self.state["documents"][doc_id]
-            doc["status"] = ProcessingStatus.COMPLETED
-            self._save_state()
-            
             return True
             
         except Exception as e:
@@ -520,75 +1078,50 @@ class PipelineManager:
         
         # Extraer metadatos
         doc_metadata = doc.get("metadata", {})
-        doc_name = doc.get("original_filename", "unknown").rsplit('.', 1)[0]
+        doc_name = self._doc_paths(doc_id)["stem"]
         source_url = agentic_json.get('metadata', {}).get('source_url', 'unknown')
         
         # Obtener chunks y figuras
         chunks = agentic_json.get("document", {}).get("chunks", [])
         figures = agentic_json.get("document", {}).get("figures", [])
         
-        # Agrupar chunks por página
-        pages_dict = {}
+        # Agrupar el texto de los chunks y las figuras por página en una sola pasada.
+        # Un chunk con varias regiones en la misma página se agrega una sola vez a
+        # esa página (si no, su texto se enviaría repetido a Mistral)
+        page_text_parts = defaultdict(list)
         for chunk in chunks:
-            grounding = chunk.get("grounding", [])
-            if grounding:
-                for ground in grounding:
-                    page_num = ground.get("page", 1)
-                    if page_num not in pages_dict:
-                        pages_dict[page_num] = []
-                    pages_dict[page_num].append(chunk)
-            else:
-                if 1 not in pages_dict:
-                    pages_dict[1] = []
-                pages_dict[1].append(chunk)
+            text = chunk.get("content") or ""
+            for page_num in _paginas(chunk):
+                page_text_parts[page_num].append(text)
         
-        # Agrupar figuras por página
-        figures_dict = {}
+        figures_dict = defaultdict(list)
         for fig in figures:
-            grounding = fig.get("grounding", [])
-            if grounding:
-                for ground in grounding:
-                    page_num = ground.get("page", 1)
-                    if page_num not in figures_dict:
-                        figures_dict[page_num] = []
-                    figures_dict[page_num].append(fig)
-            else:
-                if 1 not in figures_dict:
-                    figures_dict[1] = []
-                figures_dict[1].append(fig)
+            for page_num in _paginas(fig):
+                figures_dict[page_num].append(fig)
         
         # Construir content para todas las páginas
-        content = []
-        total_pages = max(pages_dict.keys()) if pages_dict else 1
-        
-        for page_num in range(1, total_pages + 1):
-            # Extraer texto de la página
-            page_chunks = pages_dict.get(page_num, [])
-            page_text = "\n".join([chunk.get("content", "") for chunk in page_chunks])
-            
-            # Usar Mistral para estructurar el texto de la página
-            structured_page = self._mistral_structure_page(doc_name, page_text, doc_metadata, source_url)
-            
-            # Extraer y estructurar figuras de la página
-            page_figures = figures_dict.get(page_num, [])
-            structured_images = []
-            
-            for i, fig in enumerate(page_figures):
-                fig_text = fig.get("text", "")
-                structured_fig = self._mistral_structure_image(fig_text, i, page_num, doc_metadata)
-                if structured_fig:
-                    structured_images.append(structured_fig)
-            
-            # Crear objeto de página
-            page_obj = {
-                "page_number": page_num,
-                "text": page_text,
-                "structured_page_content": structured_page,
-                "structured_image_content": structured_images,
-                "text_embedding": []
-            }
-            
-            content.append(page_obj)
+        total_pages = max(page_text_parts, default=1)
+        
+        # Reutilizar la estructuración si este PDF ya pasó por Mistral con el mismo prompt.
+        # Las páginas locales (vacías, cortas, fallback) llevan el nombre y los idiomas del
+        # documento: un mismo PDF registrado con otro nombre o AIP no comparte la entrada
+        pdf_sha256 = agentic_json.get('metadata', {}).get('pdf_sha256')
+        cache_path = None
+        if pdf_sha256:
+            variant = hashlib.blake2b(
+                _json_dumps([doc_name, doc_metadata.get('language', ['english', 'spanish'])]), digest_size=6
+            ).hexdigest()
+            cache_path = self.mistral_cache_dir / f"{pdf_sha256}_v{MISTRAL_PROMPT_VERSION}_{variant}.json"
+        cached = self._read_cache(cache_path) if cache_path else None
+        if cached is not None:
+            self.log(f"Transformación de Mistral desde caché: {doc_id}", "DEBUG")
+            content = cached["content"]
+        else:
+            content, fallbacks = self._mistral_structure_pages(doc_name, page_text_parts, figures_dict, total_pages,
+                                                               doc_metadata, source_url, self._parts_dir(doc_id))
+            # Solo cachear si ninguna página ni figura de este documento cayó en el fallback
+            if cache_path and not fallbacks:
+                _jdump_atomic({"content": content}, cache_path)
         
         # Construir JSON final
         pdf_processed = {
@@ -598,7 +1131,7 @@ class PipelineManager:
                 "document_type": doc_metadata.get('document_type', 'AIP'),
                 "source": source_url,
                 "processing_stack": ["agentic-doc", "mistral-codestral"],
-                "processed_date": datetime.now().isoformat(),
+                "processed_date": self._now_iso(),
                 "country": doc_metadata.get('country', 'unknown'),
                 "publisher": doc_metadata.get('publisher', 'unknown'),
                 "section": doc_metadata.get('section', 'GEN'),
@@ -614,43 +1147,159 @@ class PipelineManager:
         
         return pdf_processed
     
-    def _mistral_structure_page(self, doc_name: str, page_text: str, doc_metadata: Dict, source_url: str) -> Dict:
-        """Usar Mistral para estructurar el contenido de texto de una página"""
-        if not page_text or not page_text.strip():
+    def _mistral_structure_pages(self, doc_name: str, page_text_parts: Dict, figures_dict: Dict,
+                                 total_pages: int, doc_metadata: Dict, source_url: str,
+                                 parts_dir: Optional[Path] = None) -> Tuple[List[Dict], int]:
+        """
+        Estructurar con Mistral el texto y las figuras de cada página (llamadas concurrentes).
+        Devuelve el contenido y cuántas páginas y figuras de este documento cayeron en el fallback.
+        """
+        page_texts = ["\n".join(page_text_parts.get(page_num, ())) for page_num in range(1, total_pages + 1)]
+        if parts_dir is not None and figures_dict:
+            parts_dir.mkdir(parents=True, exist_ok=True)
+        
+        # Cada página y cada figura es una llamada independiente a Mistral: se lanzan
+        # en paralelo y el tiempo total pasa a ser el de las más lentas, no la suma
+        with ThreadPoolExecutor(max_workers=MISTRAL_PAGE_WORKERS) as executor:
+            page_futures = [
+                executor.submit(self._mistral_structure_page, doc_name, page_text, doc_metadata, source_url)
+                for page_text in page_texts
+            ]
+            
+            # Todas las figuras del documento en un solo lote, reagrupadas luego por página
+            images = [
+                (page_num, i, fig.get("text", ""))
+                for page_num in range(1, total_pages + 1)
+                for i, fig in enumerate(figures_dict.get(page_num, ()))
+            ]
+            images_by_page = defaultdict(list)
+            structured_figs, fallbacks = self._mistral_structure_images_bulk(images, doc_metadata, executor, parts_dir)
+            for (page_num, _, _), structured_fig in zip(images, structured_figs):
+                if structured_fig:
+                    images_by_page[page_num].append(structured_fig)
+            
+            content = []
+            for page_num, page_text, page_future in zip(range(1, total_pages + 1), page_texts, page_futures):
+                structured_page, failed = page_future.result()
+                fallbacks += failed
+                # Crear objeto de página
+                page_obj = {
+                    "page_number": page_num,
+                    "text": page_text,
+                    "structured_page_content": structured_page,
+                    "structured_image_content": images_by_page.get(page_num, []),
+                    "text_embedding": []
+                }
+                
+                content.append(page_obj)
+        
+        return content, fallbacks
+    
+    def _mistral_structure_images_bulk(self, images: List[Tuple[int, int, str]], doc_metadata: Dict,
+                                       executor: ThreadPoolExecutor,
+                                       parts_dir: Optional[Path] = None) -> Tuple[List[Optional[Dict]], int]:
+        """
+        Estructurar un lote de figuras (página, índice, texto) con llamadas concurrentes.
+        Devuelve los resultados en el mismo orden (una figura cuya llamada falla recibe el
+        fallback) y cuántas figuras cayeron en el fallback.
+        """
+        results: List[Optional[Dict]] = [None] * len(images)
+        fallbacks = 0
+        futures = {
+            executor.submit(self._mistral_structure_image, text, i, page_num, doc_metadata,
+                            parts_dir / f"img_{page_num}_{i}.json" if parts_dir is not None else None): position
+            for position, (page_num, i, text) in enumerate(images)
+        }
+        for future in as_completed(futures):
+            position = futures[future]
+            try:
+                results[position], failed = future.result()
+                fallbacks += failed
+            except Exception as e:
+                page_num, i, text = images[position]
+                with self._mistral_lock:
+                    self.mistral_errors += 1
+                self.log(f"Error estructurando imagen p{page_num}_i{i}: {str(e)}", "WARNING")
+                results[position] = self._image_fallback(text, i, page_num, doc_metadata)
+                fallbacks += 1
+        return results, fallbacks
+    
+    def _page_cache_key(self, page_text: str) -> str:
+        """Clave de caché de una página: modelo, versión del prompt y texto normalizado"""
+        normalized = " ".join(page_text.split())
+        key_source = f"{MISTRAL_MODEL}\0{MISTRAL_PROMPT_VERSION}\0{normalized}"
+        return hashlib.blake2b(key_source.encode('utf-8'), digest_size=16).hexdigest()
+    
+    def _page_cache_get(self, page_key: str) -> Optional[Dict]:
+        """Respuesta de una página desde la LRU en memoria (None si no está)"""
+        with self._mistral_lock:
+            cached = self._page_cache.get(page_key)
+            if cached is not None:
+                self._page_cache.move_to_end(page_key)
+            return cached
+    
+    def _page_cache_put(self, page_key: str, result: Dict):
+        """Guardar una respuesta en la LRU en memoria, descartando la menos usada"""
+        with self._mistral_lock:
+            self._page_cache[page_key] = result
+            self._page_cache.move_to_end(page_key)
+            if len(self._page_cache) > PAGE_CACHE_SIZE:
+                self._page_cache.popitem(last=False)
+    
+    def _mistral_structure_page(self, doc_name: str, page_text: str, doc_metadata: Dict, source_url: str) -> Tuple[Dict, bool]:
+        """Usar Mistral para estructurar el contenido de texto de una página (resultado, cayó en el fallback)"""
+        stripped = page_text.strip() if page_text else ""
+        if not stripped:
             return {
                 "file_name": doc_name,
                 "topics": ["aviation", "navigation", "charts"],
                 "languages": doc_metadata.get('language', ['english', 'spanish']),
                 "description": "Empty page",
                 "ocr_contents": {}
-            }
+            }, False
         
-        prompt = (
-            "This is the pages OCR in markdown:\n"
-            "====MARKDOWN====\n"
-            f"{page_text}\n"
-            "====END MARKDOWN====\n"
-            "Convert this into a structured JSON response with the following fields:\n"
-            "- file_name: string\n"
-            "- topics: list of strings\n"
-            "- languages: list of strings\n"
-            "- description: string\n"
-            "- ocr_contents: dictionary with the main extracted information\n"
-            "Respond only with the JSON object."
-        )
+        # Páginas con apenas unos caracteres (número de página, marcas de sección):
+        # no vale la pena una llamada a Mistral, se estructuran localmente
+        if len(stripped) < MIN_STRUCTURE_CHARS:
+            return {
+                "file_name": doc_name,
+                "topics": ["aviation", "navigation", "charts"],
+                "languages": doc_metadata.get('language', ['english', 'spanish']),
+                "description": "Short page",
+                "ocr_contents": {
+                    "raw_content": stripped
+                }
+            }, False
+        
+        prompt = _PAGE_PROMPT_PREFIX + page_text + _PROMPT_SUFFIX
+        
+        # Páginas repetidas (encabezados, "INTENTIONALLY LEFT BLANK", prefacios
+        # comunes entre AIPs) se resuelven desde la caché sin llamar a Mistral
+        page_key = self._page_cache_key(page_text)
+        cached = self._page_cache_get(page_key)
+        if cached is None:
+            cached = self._read_cache(self.mistral_pages_cache_dir / f"{page_key}.json")
+            if cached is not None:
+                self._page_cache_put(page_key, cached)
+        if cached is not None:
+            return cached, False
         
         try:
             response = self.mistral_client.chat.complete(
-                model="mistral-large-latest",
-                messages=[{"role": "user", "content": prompt}],
+                model=MISTRAL_MODEL,
+                messages=[_MISTRAL_SYSTEM_MESSAGE, {"role": "user", "content": prompt}],
                 response_format={"type": "json_object"},
                 temperature=0.2,
                 max_tokens=4000
             )
             
-            result = response.choices[0].message.content
-            return json.loads(result)
+            result = _json_loads(response.choices[0].message.content)
+            self._page_cache_put(page_key, result)
+            _jdump_atomic(result, self.mistral_pages_cache_dir / f"{page_key}.json")
+            return result, False
         except Exception as e:
+            with self._mistral_lock:
+                self.mistral_errors += 1
             self.log(f"Error estructurando página con Mistral: {str(e)}", "WARNING")
         
         # Fallback si falla Mistral
@@ -662,42 +1311,44 @@ class PipelineManager:
             "ocr_contents": {
                 "raw_content": page_text[:500]
             }
-        }
+        }, True
     
-    def _mistral_structure_image(self, image_text: str, index: int, page_num: int, doc_metadata: Dict) -> Optional[Dict]:
-        """Usar Mistral para estructurar el contenido extraído de una imagen"""
+    def _mistral_structure_image(self, image_text: str, index: int, page_num: int, doc_metadata: Dict,
+                                 part_path: Optional[Path] = None) -> Tuple[Optional[Dict], bool]:
+        """Usar Mistral para estructurar el contenido extraído de una imagen (resultado, cayó en el fallback)"""
         if not image_text or not image_text.strip():
-            return None
+            return None, False
         
-        prompt = (
-            "This is the image OCR in markdown:\n"
-            "====MARKDOWN====\n"
-            f"{image_text}\n"
-            "====END MARKDOWN====\n"
-            "Convert this into a structured JSON response with the following fields:\n"
-            "- file_name: string\n"
-            "- topics: list of strings\n"
-            "- languages: list of strings\n"
-            "- description: string\n"
-            "- ocr_contents: dictionary with the main extracted information\n"
-            "Respond only with the JSON object."
-        )
+        # Resultado guardado por una ejecución anterior interrumpida a mitad del documento
+        if part_path is not None:
+            cached = self._read_cache(part_path)
+            if cached is not None:
+                return cached, False
+        
+        prompt = _IMAGE_PROMPT_PREFIX + image_text + _PROMPT_SUFFIX
         
         try:
             response = self.mistral_client.chat.complete(
-                model="mistral-large-latest",
-                messages=[{"role": "user", "content": prompt}],
+                model=MISTRAL_MODEL,
+                messages=[_MISTRAL_SYSTEM_MESSAGE, {"role": "user", "content": prompt}],
                 response_format={"type": "json_object"},
                 temperature=0.2,
                 max_tokens=3000
             )
             
-            result = response.choices[0].message.content
-            return json.loads(result)
+            result = _json_loads(response.choices[0].message.content)
+            if part_path is not None:
+                _jdump_atomic(result, part_path)
+            return result, False
         except Exception as e:
+            with self._mistral_lock:
+                self.mistral_errors += 1
             self.log(f"Error estructurando imagen con Mistral: {str(e)}", "WARNING")
         
-        # Fallback
+        return self._image_fallback(image_text, index, page_num, doc_metadata), True
+    
+    def _image_fallback(self, image_text: str, index: int, page_num: int, doc_metadata: Dict) -> Dict:
+        """Estructura mínima de una imagen cuando Mistral no está disponible"""
         return {
             "file_name": f"imagen_p{page_num}_i{index}.jpg",
             "topics": ["aeronautical_charts", "navigation"],
@@ -714,121 +1365,181 @@ class PipelineManager:
     
     def process_all_documents(self, urls: List[str]) -> Dict:
         """Procesar lista de URLs a través del pipeline completo"""
-        self.log("=" * 60, "INFO")
-        self.log("INICIANDO PIPELINE MAESTRO", "INFO")
-        self.log("=" * 60, "INFO")
-        
-        # Agregar documentos
-        doc_ids = [self.add_document(url) for url in urls]
-        
-        results = {
-            "started_at": datetime.now().isoformat(),
-            "total_documents": len(doc_ids),
-            "documents": {}
-        }
-        
-        # Procesar cada documento
-        for i, doc_id in enumerate(doc_ids, 1):
-            self.log(f"\n[{i}/{len(doc_ids)}] Procesando documento: {doc_id}", "INFO")
-            
-            # Paso 1: Descargar
-            if not self.download_pdf(doc_id):
-                results["documents"][doc_id] = {"status": "failed", "step": "download"}
-                continue
-            
-            # Paso 2: Agentic-doc
-            if not self.process_with_agentic_doc(doc_id):
-                results["documents"][doc_id] = {"status": "failed", "step": "agentic_process"}
-                continue
-            
-            # Paso 3: Transformar
-            if not self.transform_to_pdf_processed(doc_id):
-                results["documents"][doc_id] = {"status": "failed", "step": "transform"}
-                continue
-            
-            results["documents"][doc_id] = {"status": "completed"}
-            self.log(f"✅ Documento {doc_id} completado", "SUCCESS")
-        
-        results["completed_at"] = datetime.now().isoformat()
-        
-        # Mostrar resumen
-        self._print_summary(results)
-        
-        return results
+        return self._run_pipeline(urls, self.add_document, "INICIANDO PIPELINE MAESTRO")
     
     def process_all_documents_from_json(self, documents: List[Dict]) -> Dict:
         """Procesar documentos desde array JSON con metadata"""
+        return self._run_pipeline(documents, self.add_document_from_json, "INICIANDO PIPELINE MAESTRO (desde JSON)",
+                                  name_of=lambda doc_info: doc_info.get('name'))
+    
+    def _run_pipeline(self, items, add_fn: Callable[..., Optional[str]], title: str,
+                      name_of: Optional[Callable] = None) -> Dict:
+        """Driver común: registrar cada entrada con add_fn y llevarla por las etapas pendientes"""
         self.log("=" * 60, "INFO")
-        self.log("INICIANDO PIPELINE MAESTRO (desde JSON)", "INFO")
+        self.log(title, "INFO")
         self.log("=" * 60, "INFO")
         
-        # Agregar documentos desde JSON
-        doc_ids = []
-        for doc_info in documents:
-            doc_id = self.add_document_from_json(doc_info)
-            if doc_id:
-                doc_ids.append((doc_id, doc_info))
+        # Agregar documentos; el nombre a mostrar se lee solo de las entradas aceptadas
+        # por add_fn (sin name_of se muestra el doc_id)
+        # Una URL repetida se procesa una sola vez: dos hilos con el mismo documento
+        # competirían por los mismos archivos .part/.tmp. Lo mismo vale para dos URLs
+        # distintas con el mismo nombre en un output_folder (mismas rutas de salida):
+        # la segunda se rechaza y se quita del estado
+        doc_ids: Dict[str, str] = {}
+        pdf_owners: Dict[str, str] = {}
+        for item in items:
+            doc_id = add_fn(item)
+            if not doc_id or doc_id in doc_ids:
+                continue
+            pdf_path = self._doc_paths(doc_id)["pdf_path"]
+            owner = pdf_owners.setdefault(pdf_path, doc_id)
+            if owner != doc_id:
+                self.log(f"Error: {doc_id} ({self.state['documents'][doc_id]['url']}) usa la misma ruta "
+                         f"de salida que {owner}: {pdf_path}; se omite", "ERROR")
+                self._remove_document(doc_id)
+                continue
+            doc_ids[doc_id] = (name_of(item) if name_of else None) or doc_id
         
         results = {
-            "started_at": datetime.now().isoformat(),
+            "started_at": self._now_iso(),
             "total_documents": len(doc_ids),
             "documents": {}
         }
         
         # Procesar cada documento (solo los no completados)
-        for i, (doc_id, doc_info) in enumerate(doc_ids, 1):
-            doc_status = self.state["documents"][doc_id]
-            
+        pending = []
+        outcomes = {}
+        for i, (doc_id, name) in enumerate(doc_ids.items(), 1):
             # Si ya está completado, saltar
-            if doc_status["status"] == ProcessingStatus.COMPLETED:
+            if self.state["documents"][doc_id]["status"] == ProcessingStatus.COMPLETED and not self.refresh:
                 self.log(f"[{i}/{len(doc_ids)}] Documento ya procesado (recovery): {doc_id}", "DEBUG")
-                results["documents"][doc_id] = {"status": "completed", "recovered": True}
-                continue
-            
-            self.log(f"\n[{i}/{len(doc_ids)}] Procesando documento: {doc_id} ({doc_info['name']})", "INFO")
-            
-            # Paso 1: Descargar (saltar si ya está descargado)
-            if doc_status["steps"]["download"]["status"] != ProcessingStatus.COMPLETED:
-                if not self.download_pdf(doc_id):
-                    results["documents"][doc_id] = {"status": "failed", "step": "download"}
-                    continue
-            else:
-                self.log(f"PDF ya descargado (recovery): {doc_info['name']}", "DEBUG")
-            
-            # Paso 2: Agentic-doc (saltar si ya está procesado)
-            if doc_status["steps"]["agentic_process"]["status"] != ProcessingStatus.COMPLETED:
-                if not self.process_with_agentic_doc(doc_id):
-                    results["documents"][doc_id] = {"status": "failed", "step": "agentic_process"}
-                    continue
+                outcomes[doc_id] = {"status": "completed", "recovered": True}
             else:
-                self.log(f"Agentic-doc ya procesado (recovery): {doc_info['name']}", "DEBUG")
-            
-            # Paso 3: Transformar (saltar si ya está transformado)
-            if doc_status["steps"]["transform"]["status"] != ProcessingStatus.COMPLETED:
-                if not self.transform_to_pdf_processed(doc_id):
-                    results["documents"][doc_id] = {"status": "failed", "step": "transform"}
-                    continue
-            else:
-                self.log(f"Transformación completada (recovery): {doc_info['name']}", "DEBUG")
-            
-            results["documents"][doc_id] = {"status": "completed"}
-            self.log(f"✅ Documento {doc_id} completado", "SUCCESS")
+                pending.append((doc_id, name, f"{i}/{len(doc_ids)}"))
         
-        results["completed_at"] = datetime.now().isoformat()
+        outcomes.update(self._run_stages(pending))
+        self._compact_state()
+        
+        # Mantener el orden de entrada en los resultados
+        results["documents"] = {doc_id: outcomes[doc_id] for doc_id in doc_ids}
+        
+        results["completed_at"] = self._now_iso()
         
         # Mostrar resumen
         self._print_summary(results)
         
         return results
     
+    def _run_stages(self, items: List[Tuple[str, str, str]]) -> Dict[str, Dict]:
+        """
+        Ejecutar el pipeline en tres etapas encadenadas por colas (descarga → agentic-doc
+        → Mistral): mientras un documento se transforma, el siguiente se parsea y otro
+        se descarga. Recibe tuplas (doc_id, nombre a mostrar, posición "i/N"), sin doc_id
+        repetidos, y devuelve el resultado por documento.
+        """
+        outcomes = {}
+        names = {doc_id: name for doc_id, name, _ in items}
+        # Posición de los documentos que aún no empezó ningún hilo (se anuncian al tomarlos)
+        positions = {doc_id: position for doc_id, _, position in items}
+        download_q, agentic_q, transform_q, results_q = queue.Queue(), queue.Queue(), queue.Queue(), queue.Queue()
+        
+        # (paso, cola de entrada, cola siguiente, hilos)
+        stages = [
+            ("download", download_q, agentic_q, self.parse_workers),
+            ("agentic_process", agentic_q, transform_q, self.parse_workers),
+            ("transform", transform_q, None, self.transform_workers),
+        ]
+        workers = []
+        for step, in_q, next_q, n_workers in stages:
+            for _ in range(n_workers):
+                worker = threading.Thread(target=self._stage_worker,
+                                          args=(step, in_q, next_q, results_q, names, positions), daemon=True)
+                worker.start()
+                workers.append((in_q, worker))
+        
+        # Cada documento entra directamente en la etapa de su primer paso pendiente
+        # (uno ya descargado y parseado no pasa por las colas de descarga y agentic-doc)
+        stage_queues = {step: in_q for step, in_q, _, _ in stages}
+        for doc_id, _, _ in items:
+            stage_queues[self._first_pending_step(doc_id)].put(doc_id)
+        
+        # Cada documento termina exactamente una vez (completado o fallido en alguna etapa)
+        for _ in range(len(items)):
+            doc_id, outcome = results_q.get()
+            outcomes[doc_id] = outcome
+        
+        # Detener los hilos: un centinela por hilo en la cola de su etapa
+        for in_q, _ in workers:
+            in_q.put(None)
+        for _, worker in workers:
+            worker.join()
+        
+        return outcomes
+    
+    def _stage_worker(self, step: str, in_q: queue.Queue, next_q: Optional[queue.Queue],
+                      results_q: queue.Queue, names: Dict[str, str], positions: Dict[str, str]):
+        """Hilo de una etapa: procesa documentos de su cola y los pasa a la siguiente"""
+        while True:
+            doc_id = in_q.get()
+            if doc_id is None:
+                return
+            
+            position = positions.pop(doc_id, None)
+            if position:
+                self.log(f"\n[{position}] Procesando documento: {doc_id} ({names[doc_id]})", "INFO")
+            
+            try:
+                failed_step = self._advance(doc_id, names[doc_id], (step,))
+            except Exception as e:
+                self.log(f"Error inesperado en el paso {step} para {doc_id}: {str(e)}", "ERROR")
+                self.log(f"Traceback: {traceback.format_exc()}", "DEBUG")
+                failed_step = step
+            
+            if failed_step:
+                results_q.put((doc_id, {"status": "failed", "step": failed_step}))
+            elif next_q is not None:
+                next_q.put(doc_id)
+            else:
+                self.log(f"✅ Documento {doc_id} completado", "SUCCESS")
+                results_q.put((doc_id, {"status": "completed"}))
+    
+    def _first_pending_step(self, doc_id: str) -> str:
+        """Primer paso sin completar de un documento (leyendo sus estados una sola vez)"""
+        if self.refresh:
+            return PIPELINE_STEPS[0]
+        doc_steps = self.state["documents"][doc_id]["steps"]
+        statuses = tuple(doc_steps[step]["status"] for step in PIPELINE_STEPS)
+        for step, status in zip(PIPELINE_STEPS, statuses):
+            if status != ProcessingStatus.COMPLETED:
+                return step
+        return PIPELINE_STEPS[-1]
+    
+    def _advance(self, doc_id: str, name: str, steps: Tuple[str, ...] = PIPELINE_STEPS) -> Optional[str]:
+        """
+        Avanzar un documento por la máquina de estados: ejecutar, en orden, las
+        transiciones de `steps` que aún no estén completadas. Devuelve el paso fallido o None.
+        """
+        doc_steps = self.state["documents"][doc_id]["steps"]
+        for step in steps:
+            # El estado se relee en cada paso (una descarga con --refresh puede reiniciar
+            # los siguientes si el PDF cambió); con --refresh la descarga se revalida
+            # aunque ya esté completada
+            if doc_steps[step]["status"] == ProcessingStatus.COMPLETED and not (step == "download" and self.refresh):
+                self.log(f"{STEP_LABELS[step]} ya completado (recovery): {name}", "DEBUG")
+                continue
+            if not self._transitions[step](doc_id):
+                return step
+        return None
+    
     def _print_summary(self, results: Dict):
         """Mostrar resumen del procesamiento"""
         self.log("\n" + "=" * 60, "INFO")
         self.log("RESUMEN DEL PROCESAMIENTO", "INFO")
         self.log("=" * 60, "INFO")
         
-        completed = sum(1 for r in results["documents"].values() if r["status"] == "completed")
-        failed = sum(1 for r in results["documents"].values() if r["status"] == "failed")
+        status_counts = Counter(r["status"] for r in results["documents"].values())
+        completed = status_counts["completed"]
+        failed = status_counts["failed"]
         
         self.log(f"Total de documentos: {results['total_documents']}", "INFO")
         self.log(f"Completados: {completed}", "SUCCESS")
@@ -836,25 +1547,48 @@ class PipelineManager:
         
         self.log(f"\n📁 Estructura organizada por país en: {self.work_dir}", "INFO")
         
-        # Mostrar estructura de salida por output_folder
-        output_folders = set()
-        for doc_id, doc_info in self.state["documents"].items():
-            output_folder = doc_info.get("metadata", {}).get("output_folder", "")
-            if output_folder:
-                output_folders.add(output_folder)
-        
-        for folder in sorted(output_folders):
-            country_path = self.work_dir / folder
-            pdfs_path = country_path / "pdfs"
-            agentic_path = country_path / "agentic_outputs"
-            pdf_proc_path = country_path / "pdf_processed"
-            self.log(f"  📦 {folder}/", "INFO")
-            if pdfs_path.exists():
-                self.log(f"     ├─ pdfs/ ({len(list(pdfs_path.glob('*.pdf')))} archivos)", "DEBUG")
-            if agentic_path.exists():
-                self.log(f"     ├─ agentic_outputs/ ({len(list(agentic_path.glob('*.json')))} archivos)", "DEBUG")
-            if pdf_proc_path.exists():
-                self.log(f"     └─ pdf_processed/ ({len(list(pdf_proc_path.glob('*.json')))} archivos)", "DEBUG")
+        # Mostrar estructura de salida por output_folder (con sus documentos, en una sola pasada)
+        folder_docs = Counter(
+            doc_info.get("metadata", {}).get("output_folder", "")
+            for doc_info in self.state["documents"].values()
+        )
+        folder_docs.pop("", None)
+        
+        for folder in sorted(folder_docs):
+            n_pdfs, n_agentic, n_processed = self._count_folder(folder)
+            self.log(f"  📦 {folder}/ ({folder_docs[folder]} documentos)", "INFO")
+            if n_pdfs is not None:
+                self.log(f"     ├─ pdfs/ ({n_pdfs} archivos)", "DEBUG")
+            if n_agentic is not None:
+                self.log(f"     ├─ agentic_outputs/ ({n_agentic} archivos)", "DEBUG")
+            if n_processed is not None:
+                self.log(f"     └─ pdf_processed/ ({n_processed} archivos)", "DEBUG")
+    
+    def _count_folder(self, folder: str) -> Tuple[Optional[int], ...]:
+        """
+        Archivos en pdfs/, agentic_outputs/ y pdf_processed/ de un output_folder
+        (None si la carpeta no existe). Solo se vuelve a escanear una carpeta si
+        cambió su mtime desde el último resumen.
+        """
+        country_path = self.work_dir / folder
+        counts = []
+        for subdir, suffix in _SUMMARY_SUBDIRS:
+            path = country_path / subdir
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except FileNotFoundError:
+                counts.append(None)
+                continue
+            key = (folder, subdir)
+            cached = self._folder_counts.get(key)
+            if cached is None or cached[0] != mtime:
+                n_files = _count_ext(path, suffix)
+                if n_files is None:  # Borrada entre el stat y el escaneo
+                    counts.append(None)
+                    continue
+                cached = self._folder_counts[key] = (mtime, n_files)
+            counts.append(cached[1])
+        return tuple(counts)
         
     def get_final_files(self) -> Dict[str, Dict[str, str]]:
         """Retornar mapeo de archivos finales por documento"""
@@ -873,6 +1607,33 @@ class PipelineManager:
 # MAIN
 # ============================================================================
 
+def _discover_docs_json(work_dirs: List[str]) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Buscar el JSON de documentos de alguna AIP: un os.scandir de {work_dir}/_AIPs
+    por directorio de trabajo (en orden alfabético de país). Devuelve (ruta, país).
+    """
+    for work_dir in dict.fromkeys(work_dirs):
+        try:
+            with os.scandir(Path(work_dir) / "_AIPs") as entries:
+                countries = sorted(entry.name for entry in entries if entry.is_dir())
+        except FileNotFoundError:
+            continue
+        
+        for country in countries:
+            candidate = os.path.join(work_dir, "_AIPs", country, "docs_to_process", f"{country}_Docs_AIP_links.json")
+            if os.access(candidate, os.F_OK):
+                return candidate, country
+    return None, None
+
+def _document_aips(documents: List[Dict]) -> set:
+    """Países de AIP presentes en los output_folder ("_AIPs/argentina" → "argentina")"""
+    aips = set()
+    for doc_info in documents:
+        parts = doc_info.get("output_folder", "").split('/')
+        if len(parts) == 2 and parts[0] == "_AIPs":
+            aips.add(parts[1])
+    return aips
+
 def main():
     parser = argparse.ArgumentParser(
         description='Pipeline Maestro: Descarga → Agentic-doc → PDF-Processed'
@@ -898,6 +1659,22 @@ def main():
         action='store_true',
         help='Modo verbose'
     )
+    parser.add_argument(
+        '--pretty',
+        action='store_true',
+        help='Escribir los JSON de salida indentados (más lentos y pesados, útil para depurar)'
+    )
+    parser.add_argument(
+        '--concurrency', '-c',
+        type=int,
+        default=None,
+        help='Documentos procesados en paralelo por etapa (default: BATCH_SIZE para descarga/agentic-doc y 4 para Mistral)'
+    )
+    parser.add_argument(
+        '--refresh',
+        action='store_true',
+        help='Revalidar los PDFs ya descargados con el servidor (ETag/Last-Modified) y reprocesar los que cambiaron'
+    )
     
     args = parser.parse_args()
     
@@ -915,28 +1692,10 @@ def main():
                 sys.exit(1)
         else:
             # Si no se especifica AIP, buscar automáticamente
-            possible_paths = [
-                Path(args.work_dir) / "_AIPs" / "argentina" / "docs_to_process" / "argentina_Docs_AIP_links.json",
-                Path(args.work_dir) / "_AIPs" / "dominican_republic" / "docs_to_process" / "dominican_republic_Docs_AIP_links.json",
-                Path(args.work_dir) / "_AIPs" / "spain" / "docs_to_process" / "spain_Docs_AIP_links.json",
-                Path("work") / "_AIPs" / "argentina" / "docs_to_process" / "argentina_Docs_AIP_links.json",
-                Path("work") / "_AIPs" / "dominican_republic" / "docs_to_process" / "dominican_republic_Docs_AIP_links.json",
-                Path("work") / "_AIPs" / "spain" / "docs_to_process" / "spain_Docs_AIP_links.json",
-            ]
-            
-            for possible_path in possible_paths:
-                if possible_path.exists():
-                    docs_json_path = str(possible_path)
-                    # Detectar AIP del path
-                    parts = possible_path.parts
-                    for i, part in enumerate(parts):
-                        if part == "_AIPs" and i + 1 < len(parts):
-                            aip_country = parts[i + 1]
-                            break
-                    print(f"✅ Archivo JSON detectado automáticamente: {docs_json_path}")
-                    break
-            
-            if not docs_json_path:
+            docs_json_path, aip_country = _discover_docs_json([args.work_dir, "work"])
+            if docs_json_path:
+                print(f"✅ Archivo JSON detectado automáticamente: {docs_json_path}")
+            else:
                 print("❌ Error: No se encontró archivo JSON")
                 print("   Opciones:")
                 print("   1. Proporciona --aip argentina|dominican_republic|spain")
@@ -946,8 +1705,7 @@ def main():
     
     # Cargar documentos desde JSON
     try:
-        with open(docs_json_path, 'r', encoding='utf-8') as f:
-            documents = json.load(f)
+        documents = _jload(docs_json_path)
         
         if not isinstance(documents, list):
             print("❌ Error: El archivo JSON debe contener un array de documentos")
@@ -961,15 +1719,17 @@ def main():
         print(f"❌ Error al parsear JSON: {e}")
         sys.exit(1)
     
-    # Si aún no tenemos el país (cuando se usa --docs-json), intentar detectarlo del output_folder
-    if not aip_country:
-        if documents and len(documents) > 0:
-            output_folder = documents[0].get("output_folder", "")
-            if output_folder:
-                # output_folder es como "_AIPs/argentina" o "_AIPs/dominican_republic"
-                parts = output_folder.split('/')
-                if len(parts) == 2 and parts[0] == "_AIPs":
-                    aip_country = parts[1]
+    # Validar de una vez los output_folder: todos los documentos deben ser de la misma AIP
+    # (y, si no se indicó --aip, de ahí se toma el país)
+    doc_aips = _document_aips(documents)
+    if len(doc_aips) > 1:
+        print(f"❌ Error: El JSON mezcla documentos de varias AIPs: {', '.join(sorted(doc_aips))}")
+        sys.exit(1)
+    if aip_country and doc_aips and aip_country not in doc_aips:
+        print(f"❌ Error: Los documentos son de la AIP '{next(iter(doc_aips))}', no de '{aip_country}'")
+        sys.exit(1)
+    if not aip_country and doc_aips:
+        aip_country = doc_aips.pop()
     
     if not aip_country:
         print("❌ Error: No se pudo determinar el AIP")
@@ -977,10 +1737,25 @@ def main():
         sys.exit(1)
     
     # Crear gestor con el país detectado
-    manager = PipelineManager(work_dir=args.work_dir, verbose=args.verbose, aip_country=aip_country)
+    if args.concurrency is not None and args.concurrency < 1:
+        print("❌ Error: --concurrency debe ser al menos 1")
+        sys.exit(1)
+    if args.concurrency is None:
+        batch_size = os.getenv('BATCH_SIZE', '4')
+        if not batch_size.strip().isdigit() or int(batch_size) < 1:
+            print(f"❌ Error: BATCH_SIZE debe ser un entero de al menos 1 (valor actual: {batch_size!r})")
+            sys.exit(1)
+    
+    stage_workers = {}
+    if args.concurrency:
+        stage_workers = {"parse_workers": args.concurrency, "transform_workers": args.concurrency}
+    
+    manager = PipelineManager(work_dir=args.work_dir, verbose=args.verbose, aip_country=aip_country,
+                              pretty_json=args.pretty, refresh=args.refresh, **stage_workers)
     
     # Procesar documentos
     results = manager.process_all_documents_from_json(documents)
+    manager.close()  # Vacía los logs pendientes antes de imprimir el resto
     
     # Mostrar archivos finales
     files_map = manager.get_final_files()
@@ -1002,9 +1777,10 @@ def main():
         summary_path = Path(args.work_dir) / "state" / "final_results.json"
     
     summary_path.parent.mkdir(parents=True, exist_ok=True)
-    with open(summary_path, 'w') as f:
-        json.dump(results, f, indent=2)
-    print(f"\n✅ Resumen guardado en: {summary_path}")
+    if _jdump_if_changed(results, summary_path, indent=args.pretty, ignore=("started_at", "completed_at")):
+        print(f"\n✅ Resumen guardado en: {summary_path}")
+    else:
+        print(f"\n✅ Resumen sin cambios (solo se actualizaron las fechas de la ejecución): {summary_path}")
     
     sys.exit(0)
 
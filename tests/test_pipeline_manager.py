@@ -0,0 +1,48 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("httpx")
+pytest.importorskip("mistralai")
+pytest.importorskip("requests")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from main import PipelineManager
+
+
+@pytest.fixture
+def pipeline(tmp_path):
+    manager = PipelineManager(work_dir=str(tmp_path / "work"))
+    yield manager
+    manager.close()
+
+
+def test_same_name_with_different_urls_runs_once(pipeline, monkeypatch):
+    documents = [
+        {"source": "https://example.com/a/GEN_1.pdf", "name": "GEN 1", "output_folder": "test"},
+        {"source": "https://example.com/b/GEN_1.pdf", "name": "GEN 1", "output_folder": "test"},
+    ]
+    staged = []
+    logged = []
+    monkeypatch.setattr(pipeline, "_run_stages",
+                        lambda items: staged.extend(items) or {doc_id: {"status": "completed"} for doc_id, _, _ in items})
+    monkeypatch.setattr(pipeline, "log", lambda message, level="INFO": logged.append((level, message)))
+
+    results = pipeline.process_all_documents_from_json(documents)
+
+    first_id = pipeline._get_document_id(documents[0]["source"])
+    second_id = pipeline._get_document_id(documents[1]["source"])
+    assert [doc_id for doc_id, _, _ in staged] == [first_id]
+    assert list(results["documents"]) == [first_id]
+    assert any(level == "ERROR" and "misma ruta" in message for level, message in logged)
+    assert second_id not in pipeline.state["documents"]
+
+    # El documento rechazado tampoco vuelve al recargar el estado
+    pipeline.close()
+    reloaded = PipelineManager(work_dir=str(pipeline.work_dir))
+    try:
+        assert list(reloaded.state["documents"]) == [first_id]
+    finally:
+        reloaded.close()